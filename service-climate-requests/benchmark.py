@@ -0,0 +1,738 @@
+# benchmark.py
+"""Бенчмарки API и слоя данных.
+
+БД для замеров создается во временном каталоге (из inputData*.csv или
+генерируется по seed), рабочая repair_requests.db не затрагивается.
+
+    python benchmark.py auth
+    python benchmark.py slow-query --concurrency 50
+    python benchmark.py logins --pool-sizes 1 2 4 8
+    python benchmark.py serialize --rows 10000 100000 1000000
+    python benchmark.py --db bench_100k.db api --requests 100000 --output before.json
+    python benchmark.py --db bench_100k.db api --requests 100000 --compare before.json
+    python benchmark.py api --sql-trace --slow-ms 5 --scenarios comments list search
+    python benchmark.py writes --threads 1 4 16 --synchronous FULL
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Tuple
+
+import database
+
+
+def summarize(samples_ms: list) -> dict:
+    """Сводка по замерам в миллисекундах"""
+    ordered = sorted(samples_ms)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def measure(func, iterations: int, warmup: int = 100) -> list:
+    """Время каждого вызова func() в миллисекундах"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def print_summary(name: str, summary: dict):
+    print(f"{name:40s} p50={summary['p50_ms']:9.3f} мс  "
+          f"p95={summary['p95_ms']:9.3f} мс  p99={summary['p99_ms']:9.3f} мс")
+
+
+def prepare_database(path: str = None) -> str:
+    """Подключить БД для замеров (по умолчанию - временная, из inputData*.csv)"""
+    if path is None:
+        import import_data
+
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+        here = os.path.dirname(os.path.abspath(__file__))
+        import_data.run_import(path, {
+            "users": os.path.join(here, "inputDataUsers.csv"),
+            "requests": os.path.join(here, "inputDataRequests.csv"),
+            "comments": os.path.join(here, "inputDataComments.csv"),
+        })
+    database.DATABASE_PATH = path
+    database.init_db()
+    return path
+
+# ---------- АУТЕНТИФИКАЦИЯ ----------
+
+def bench_auth(args):
+    """Накладные расходы get_current_user на запрос: без кэшей и с кэшами"""
+    prepare_database(args.db)
+    import main
+    import models
+
+    token = main.create_access_token({"user_id": 1, "role": "Менеджер", "fio": "bench"})
+    loop = asyncio.new_event_loop()
+
+    def authenticate():
+        return loop.run_until_complete(main.get_current_user(token))
+
+    def authenticate_uncached():
+        # Поведение до кэширования: разбор JWT и чтение пользователя из БД
+        main.token_cache.clear()
+        models.user_cache.clear()
+        return authenticate()
+
+    checker = main.require_roles("Менеджер")
+
+    def authenticate_and_check_role():
+        return loop.run_until_complete(checker(authenticate()))
+
+    print(f"Аутентификация, {args.iterations} итераций")
+    print_summary("без кэша (JWT + SELECT users)", summarize(measure(authenticate_uncached, args.iterations)))
+    print_summary("с кэшем токенов и пользователей", summarize(measure(authenticate, args.iterations)))
+    print_summary("с кэшем + require_roles", summarize(measure(authenticate_and_check_role, args.iterations)))
+    loop.close()
+
+# ---------- МЕДЛЕННЫЙ ЗАПРОС ПОД НАГРУЗКОЙ ----------
+
+SLOW_QUERY = """
+    WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter WHERE x < ?)
+    SELECT SUM(x) FROM counter
+"""
+
+def run_slow_query(rows: int):
+    """Запрос к SQLite, занимающий заметное время"""
+    with database.get_db_cursor() as (cursor, _):
+        cursor.execute(SLOW_QUERY, (rows,))
+        return cursor.fetchone()[0]
+
+
+async def load_with_slow_query(app, token: str, args, in_executor: bool) -> dict:
+    """Параллельные GET /me (с чтением пользователя из БД) на фоне медленных запросов"""
+    import httpx
+    import models
+
+    headers = {"Authorization": f"Bearer {token}"}
+    samples = []
+    slow_seconds = []
+    deadline = time.perf_counter() + args.duration
+
+    async def client_worker(client):
+        while time.perf_counter() < deadline:
+            models.user_cache.clear()
+            started = time.perf_counter()
+            response = await client.get("/me", headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    async def slow_worker():
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(args.slow_interval)
+            started = time.perf_counter()
+            if in_executor:
+                await database.run_in_db_executor(run_slow_query, args.slow_rows)
+            else:
+                # Как раньше: синхронный вызов models прямо в цикле событий
+                run_slow_query(args.slow_rows)
+            slow_seconds.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(slow_worker(), *(client_worker(client) for _ in range(args.concurrency)))
+
+    summary = summarize(samples)
+    summary["slow_query_ms"] = statistics.fmean(slow_seconds) * 1000 if slow_seconds else 0
+    return summary
+
+
+def bench_slow_query(args):
+    """Задержки параллельных запросов, пока выполняется медленный запрос к БД"""
+    prepare_database(args.db)
+    import main
+
+    token = main.create_access_token({"user_id": 1, "role": "Менеджер", "fio": "bench"})
+    print(f"GET /me x{args.concurrency} параллельно, {args.duration} с, "
+          f"медленный запрос каждые {args.slow_interval} с")
+    for name, in_executor in (("медленный запрос в цикле событий", False),
+                              ("медленный запрос в пуле потоков БД", True)):
+        summary = asyncio.run(load_with_slow_query(main.app, token, args, in_executor))
+        print_summary(name, summary)
+        print(f"{'':40s} запросов: {summary['count']}, медленный запрос: {summary['slow_query_ms']:.0f} мс")
+    database.close_all_connections()
+
+# ---------- ВХОД (BCRYPT) ----------
+
+async def run_logins(app, credentials: list, count: int, concurrency: int) -> Tuple[float, list]:
+    """count входов через POST /token с concurrency параллельными клиентами"""
+    import httpx
+
+    samples = []
+    remaining = iter(range(count))
+
+    async def client_worker(client):
+        for i in remaining:
+            login, password = credentials[i % len(credentials)]
+            started = time.perf_counter()
+            response = await client.post("/token", data={"username": login, "password": password})
+            samples.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(client_worker(client) for _ in range(concurrency)))
+    return time.perf_counter() - started, samples
+
+
+def bench_logins(args):
+    """Пропускная способность /token при разных размерах пула bcrypt"""
+    import csv
+
+    prepare_database(args.db)
+    import main
+    import models
+    import passwords
+
+    passwords.pwd_context.update(bcrypt__rounds=args.rounds)
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "inputDataUsers.csv"), encoding="utf-8-sig", newline="") as f:
+        credentials = [(row["login"], row["password"]) for row in csv.DictReader(f, delimiter=";")]
+
+    # Первый вход перехэширует открытые пароли - замеряем уже на хэшах
+    for login, password in credentials:
+        user = models.get_user_by_login(login)
+        models.update_user_password(user["user_id"], passwords.hash_password(password))
+
+    print(f"POST /token: bcrypt rounds={args.rounds}, {args.logins} входов, "
+          f"{args.concurrency} параллельных клиентов, CPU: {os.cpu_count()}")
+    for pool_size in args.pool_sizes:
+        passwords.shutdown_hash_executor()
+        passwords.PASSWORD_HASH_WORKERS = pool_size
+        elapsed, samples = asyncio.run(run_logins(main.app, credentials, args.logins, args.concurrency))
+        print_summary(f"пул bcrypt: {pool_size} потоков, {args.logins / elapsed:7.1f} входов/с", summarize(samples))
+    passwords.shutdown_hash_executor()
+    database.close_all_connections()
+
+# ---------- СЕРИАЛИЗАЦИЯ СПИСКОВ ----------
+
+BENCH_PASSWORD = "bench"
+
+
+def generate_requests_database(count: int, seed: int = 0, specialists: int = 20, clients: int = 1000,
+                               path: str = None) -> str:
+    """БД с count заявками через generate_data (те же распределения, что и у генератора данных)"""
+    import generate_data
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+    generator = generate_data.DataGenerator(seed=seed, specialists=specialists, clients=clients, requests=count)
+    generate_data.write_sqlite(generator, path)
+    set_bench_passwords(path)
+    return path
+
+
+def set_bench_passwords(path: str):
+    """Пароль BENCH_PASSWORD всем пользователям (хэш с текущей стоимостью bcrypt).
+
+    Иначе сценарий входа замерял бы перехэширование открытых паролей
+    generate_data при первом входе каждого пользователя.
+    """
+    import sqlite3
+
+    import passwords
+
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute("UPDATE users SET password = ?", (passwords.hash_password(BENCH_PASSWORD),))
+    finally:
+        conn.close()
+
+
+def legacy_requests_page(limit: int) -> list:
+    """Страница заявок как раньше: словарь на каждую строку sqlite3.Row"""
+    with database.get_db_cursor() as (cursor, _):
+        cursor.execute("SELECT * FROM requests ORDER BY start_date DESC, request_id DESC LIMIT ?", (limit + 1,))
+        return [dict(row) for row in cursor.fetchall()][:limit]
+
+
+def measure_peak(func) -> Tuple[float, float, int]:
+    """Время (мс), пиковая память Python-аллокаций (МБ) и размер ответа func()"""
+    started = time.perf_counter()
+    size = len(func())
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    # Память - отдельным вызовом: tracemalloc замедляет выполнение
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak / 2 ** 20, size
+
+
+def bench_serialize(args):
+    """Выборка и кодирование страницы заявок: прежний путь и serialization.py"""
+    import json as std_json
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    import models
+    import serialization
+
+    if args.db:
+        prepare_database(args.db)
+    else:
+        print(f"Генерация {max(args.rows)} заявок...")
+        prepare_database(generate_requests_database(max(args.rows)))
+
+    def fast_json(obj):
+        return std_json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def legacy(limit):
+        # dict(row) в models, jsonable_encoder и JSONResponse в FastAPI
+        return JSONResponse(jsonable_encoder(legacy_requests_page(limit))).body
+
+    def objects(limit, dumps=serialization.dumps):
+        columns, rows, _ = models.get_requests_page_rows({}, limit)
+        return dumps(serialization.rows_to_objects(columns, rows))
+
+    def columns(limit, dumps=serialization.dumps):
+        columns, rows, _ = models.get_requests_page_rows({}, limit)
+        return dumps(serialization.columns_payload(columns, rows))
+
+    paths = [
+        ("dict + jsonable_encoder (было)", legacy),
+        (f"объекты, {serialization.JSON_BACKEND}", objects),
+        (f"колонки, {serialization.JSON_BACKEND}", columns),
+    ]
+    if serialization.JSON_BACKEND != "json":
+        paths.append(("колонки, json (без orjson)", lambda limit: columns(limit, fast_json)))
+
+    print(f"Кодирование страницы заявок; лучшее из {args.repeat} по времени, пик памяти - tracemalloc")
+    for limit in args.rows:
+        print(f"--- {limit} строк")
+        for name, func in paths:
+            results = [measure_peak(lambda: func(limit)) for _ in range(args.repeat)]
+            elapsed_ms = min(r[0] for r in results)
+            peak_mb = min(r[1] for r in results)
+            size = results[0][2]
+            print(f"{name:40s} {elapsed_ms:10.1f} мс  пик {peak_mb:8.1f} МБ  ответ {size / 2 ** 20:7.1f} МБ")
+    database.close_all_connections()
+
+# ---------- ЗАПИСИ: ГРУППОВАЯ ФИКСАЦИЯ ----------
+
+def run_writes(threads: int, writes_per_thread: int, request_count: int, specialist_ids: list, seed: int):
+    """Параллельные записи через models: (секунд, ошибок, пример ошибки)"""
+    import random
+    import threading
+
+    import generate_data
+    import models
+
+    errors = []
+    barrier = threading.Barrier(threads + 1)
+
+    def writer(index):
+        rng = random.Random(seed + index)
+        barrier.wait()
+        for i in range(writes_per_thread):
+            request_id = rng.randint(1, request_count)
+            try:
+                if i % 4 == 3:
+                    models.update_request(request_id, {"request_status": rng.choice(generate_data.STATUSES)})
+                else:
+                    models.create_comment("Комментарий бенчмарка", rng.choice(specialist_ids), request_id)
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started, len(errors), repr(errors[0]) if errors else ""
+
+
+def bench_writes(args):
+    """Записей в секунду: отдельная транзакция на запись и очередь с групповой фиксацией"""
+    database.CONNECTION_PRAGMAS = tuple(
+        f"PRAGMA synchronous = {args.synchronous}" if pragma.startswith("PRAGMA synchronous") else pragma
+        for pragma in database.CONNECTION_PRAGMAS
+    )
+    if args.db:
+        prepare_database(args.db)
+    else:
+        prepare_database(generate_requests_database(args.requests, seed=args.seed))
+
+    with database.get_db_cursor() as (cursor, _):
+        cursor.execute("SELECT MAX(request_id) FROM requests")
+        request_count = cursor.fetchone()[0]
+        cursor.execute("SELECT user_id FROM users WHERE role = 'Специалист'")
+        specialist_ids = [row[0] for row in cursor.fetchall()]
+
+    print(f"Записи (3/4 комментарии, 1/4 изменение статуса), synchronous={args.synchronous}, "
+          f"{args.writes} записей на поток, CPU: {os.cpu_count()}")
+    for threads in args.threads:
+        for name, group_commit in (("транзакция на запись", False), ("групповая фиксация", True)):
+            database.GROUP_COMMIT = group_commit
+            elapsed, errors, sample = run_writes(threads, args.writes, request_count, specialist_ids, args.seed)
+            total = threads * args.writes
+            print(f"{threads:3d} потоков, {name:22s} {total / elapsed:9.0f} записей/с"
+                  + (f"  ошибок: {errors} ({sample})" if errors else ""))
+    database.close_all_connections()
+
+# ---------- НАБОР СЦЕНАРИЕВ API ----------
+
+class RssSampler:
+    """Пиковый RSS процесса за время блока with (опрос в отдельном потоке), МБ"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = None
+        self._thread = None
+
+    @staticmethod
+    def current_mb() -> float:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+        except (OSError, ValueError, AttributeError):
+            # Не Linux: максимальный RSS за все время процесса
+            import resource
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 2 ** 10
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+
+    def __enter__(self):
+        import threading
+
+        self.peak_mb = self.current_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self.current_mb())
+
+
+def api_scenarios(tokens: dict, users: dict, request_count: int, rng) -> list:
+    """Сценарии: (имя, функция rng -> (метод, URL, параметры httpx))"""
+    import generate_data
+
+    manager = {"Authorization": f"Bearer {tokens['manager']}"}
+    operator = {"Authorization": f"Bearer {tokens['operator']}"}
+    specialist = {"Authorization": f"Bearer {tokens['specialist']}"}
+
+    def request_id():
+        return rng.randint(1, request_count)
+
+    def new_request():
+        tech_type = rng.choice(list(generate_data.TECH_TYPES))
+        _, models, problems = generate_data.TECH_TYPES[tech_type]
+        return {"start_date": "2024-01-01", "climate_tech_type": tech_type, "climate_tech_model": rng.choice(models),
+                "problem_description": rng.choice(problems), "request_status": "Новая заявка",
+                "client_id": rng.choice(users["client_ids"])}
+
+    return [
+        ("login", lambda: ("POST", "/token", {
+            "data": {"username": rng.choice(users["logins"]), "password": BENCH_PASSWORD}})),
+        ("list", lambda: ("GET", "/requests", {"params": {"limit": 50}, "headers": manager})),
+        ("list_columns", lambda: ("GET", "/requests", {
+            "params": {"limit": 50, "format": "columns"}, "headers": manager})),
+        ("list_specialist", lambda: ("GET", "/requests", {"params": {"limit": 50}, "headers": specialist})),
+        ("detail", lambda: ("GET", f"/requests/{request_id()}", {"headers": manager})),
+        ("search", lambda: ("GET", "/search", {"params": {"q": rng.choice(["шумит", "гарью", "пульт"])},
+                                               "headers": manager})),
+        ("comments", lambda: ("GET", f"/requests/{request_id()}/comments", {"headers": manager})),
+        ("comments_batch", lambda: ("GET", "/comments", {
+            "params": {"request_ids": [request_id() for _ in range(20)]}, "headers": manager})),
+        ("stats_completed_count", lambda: ("GET", "/stats/completed-count", {"headers": manager})),
+        ("stats_average_time", lambda: ("GET", "/stats/average-time", {"headers": manager})),
+        ("stats_status", lambda: ("GET", "/stats/status", {"headers": manager})),
+        ("stats_status_window", lambda: ("GET", "/stats/status", {
+            "params": {"date_from": "2022-01-01", "date_to": "2022-03-31"}, "headers": manager})),
+        ("stats_problems", lambda: ("GET", "/stats/problems", {"headers": manager})),
+        ("stats_all", lambda: ("GET", "/stats/all", {"headers": manager})),
+        ("stats_specialists", lambda: ("GET", "/stats/specialists", {"headers": manager})),
+        ("stats_user", lambda: ("GET", f"/stats/users/{rng.choice(users['specialist_ids'])}",
+                                {"headers": manager})),
+        # Изменяющие сценарии - последними, чтобы не влиять на чтение
+        ("create", lambda: ("POST", "/requests", {"headers": operator, "json": new_request()})),
+        ("update", lambda: ("PUT", f"/requests/{request_id()}", {"headers": manager, "json": {
+            "request_status": rng.choice(generate_data.STATUSES)}})),
+        ("comment_create", lambda: ("POST", f"/requests/{request_id()}/comments", {"headers": manager, "json": {
+            "message": "Комментарий бенчмарка", "request_id": 0}})),
+    ]
+
+
+async def run_scenario(app, make_request, iterations: int, concurrency: int) -> dict:
+    """iterations запросов сценария с concurrency параллельными клиентами"""
+    import httpx
+
+    samples = []
+    errors = 0
+    remaining = iter(range(iterations))
+
+    async def client_worker(client):
+        nonlocal errors
+        for _ in remaining:
+            method, url, kwargs = make_request()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        with RssSampler() as rss:
+            started = time.perf_counter()
+            await asyncio.gather(*(client_worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+    summary = summarize(samples)
+    summary.update({
+        "errors": errors,
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": rss.peak_mb,
+    })
+    return summary
+
+
+def benchmark_metadata(args) -> dict:
+    """Условия замера для сравнения прогонов"""
+    import platform
+    import sqlite3
+    import subprocess
+
+    import passwords
+    import serialization
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "requests": args.requests,
+        "seed": args.seed,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "bcrypt_rounds": args.rounds,
+        "db_pool_size": database.POOL_SIZE,
+        "password_hash_workers": passwords.PASSWORD_HASH_WORKERS,
+        "json_backend": serialization.JSON_BACKEND,
+    }
+
+
+def compare_results(baseline: dict, results: dict, max_regression: float) -> list:
+    """Сценарии, где p95 выросла или пропускная способность упала больше чем на max_regression %"""
+    regressions = []
+    print(f"{'сценарий':24s} {'p95 было':>10s} {'p95 стало':>10s} {'RPS было':>10s} {'RPS стало':>10s}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        p95_change = (current["p95_ms"] / previous["p95_ms"] - 1) * 100 if previous["p95_ms"] else 0.0
+        rps_change = (1 - current["throughput_rps"] / previous["throughput_rps"]) * 100 \
+            if previous["throughput_rps"] else 0.0
+        mark = ""
+        if p95_change > max_regression or rps_change > max_regression:
+            regressions.append(name)
+            mark = "  <-- регрессия"
+        print(f"{name:24s} {previous['p95_ms']:10.2f} {current['p95_ms']:10.2f} "
+              f"{previous['throughput_rps']:10.1f} {current['throughput_rps']:10.1f}{mark}")
+    return regressions
+
+
+def bench_api(args):
+    """Сценарии API на сгенерированной БД: RPS, p50/p95/p99, пиковый RSS, результаты в JSON"""
+    import json
+    import random
+
+    import passwords
+
+    passwords.pwd_context.update(bcrypt__rounds=args.rounds)
+    if args.db and os.path.exists(args.db):
+        # Сценарии изменяют данные - замер идет на копии, БД остается одинаковой между прогонами
+        import sqlite3
+
+        print(f"БД: копия {args.db}")
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+        source, target = sqlite3.connect(args.db), sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        set_bench_passwords(path)
+        prepare_database(path)
+    else:
+        print(f"Генерация БД: {args.requests} заявок, seed={args.seed}...")
+        prepare_database(generate_requests_database(
+            args.requests, seed=args.seed, specialists=args.specialists, clients=args.clients, path=args.db
+        ))
+
+    import main as app_module
+    import models
+
+    with database.get_db_cursor() as (cursor, _):
+        cursor.execute("SELECT user_id, login, role FROM users ORDER BY user_id")
+        bench_users = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT MAX(request_id) FROM requests")
+        request_count = cursor.fetchone()[0] or 0
+    roles = {u["role"] for u in bench_users}
+    if not request_count or not {"Менеджер", "Оператор", "Специалист", "Заказчик"} <= roles:
+        print("В БД нет заявок или пользователей всех ролей")
+        return 1
+    users = {
+        "logins": [u["login"] for u in bench_users],
+        "specialist_ids": [u["user_id"] for u in bench_users if u["role"] == "Специалист"],
+        "client_ids": [u["user_id"] for u in bench_users if u["role"] == "Заказчик"],
+    }
+    by_role = {u["role"]: u for u in reversed(bench_users)}
+    tokens = {
+        name: app_module.create_access_token({"user_id": by_role[role]["user_id"], "role": role, "fio": "bench"})
+        for name, role in (("manager", "Менеджер"), ("operator", "Оператор"), ("specialist", "Специалист"))
+    }
+
+    if args.sql_trace:
+        import sqltrace
+
+        slow_log = os.path.join(tempfile.mkdtemp(prefix="bench_"), "slow_queries.log")
+        sqltrace.enable(slow_ms=args.slow_ms, log_path=slow_log)
+
+    rng = random.Random(args.seed)
+    scenarios = api_scenarios(tokens, users, request_count, rng)
+    if args.scenarios:
+        scenarios = [(name, make) for name, make in scenarios if name in args.scenarios]
+
+    results = {"meta": benchmark_metadata(args), "scenarios": {}}
+    print(f"{args.iterations} запросов на сценарий, {args.concurrency} параллельных клиентов")
+    for name, make_request in scenarios:
+        iterations = min(args.iterations, args.login_iterations) if name == "login" else args.iterations
+        # Прогрев: кэши пользователей, токенов, страниц SQLite
+        asyncio.run(run_scenario(app_module.app, make_request, min(args.warmup, iterations), args.concurrency))
+        summary = asyncio.run(run_scenario(app_module.app, make_request, iterations, args.concurrency))
+        results["scenarios"][name] = summary
+        print_summary(name, summary)
+        print(f"{'':40s} {summary['throughput_rps']:9.1f} запр/с  RSS {summary['peak_rss_mb']:7.1f} МБ"
+              + (f"  ошибок: {summary['errors']}" if summary["errors"] else ""))
+    models.invalidate_statistics()
+    database.close_all_connections()
+    passwords.shutdown_hash_executor()
+
+    if args.sql_trace:
+        sqltrace.disable()
+        print("--- SQL: наибольшее суммарное время")
+        sqltrace.print_top_statements()
+        print(f"--- Медленные запросы (>= {args.slow_ms} мс), журнал: {slow_log}")
+        if os.path.exists(slow_log):
+            sqltrace.main([slow_log])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты: {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.max_regression)
+        if regressions:
+            print(f"Регрессии больше {args.max_regression}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки API учета заявок")
+    parser.add_argument("--db", default=None, help="готовая БД (по умолчанию - временная из CSV)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    auth = subparsers.add_parser("auth", help="накладные расходы аутентификации на запрос")
+    auth.add_argument("--iterations", type=int, default=5000)
+    auth.set_defaults(func=bench_auth)
+
+    slow = subparsers.add_parser("slow-query", help="задержки под нагрузкой при медленном запросе к БД")
+    slow.add_argument("--concurrency", type=int, default=50)
+    slow.add_argument("--duration", type=float, default=5.0, help="длительность замера, с")
+    slow.add_argument("--slow-rows", type=int, default=3_000_000, help="размер медленного запроса")
+    slow.add_argument("--slow-interval", type=float, default=0.5, help="пауза между медленными запросами, с")
+    slow.set_defaults(func=bench_slow_query)
+
+    logins = subparsers.add_parser("logins", help="входов в секунду при разных размерах пула bcrypt")
+    logins.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    logins.add_argument("--logins", type=int, default=100)
+    logins.add_argument("--concurrency", type=int, default=16)
+    logins.add_argument("--rounds", type=int, default=10, help="стоимость bcrypt для замера")
+    logins.set_defaults(func=bench_logins)
+
+    serialize = subparsers.add_parser("serialize", help="время и память кодирования больших списков заявок")
+    serialize.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    serialize.add_argument("--repeat", type=int, default=1, help="повторов каждого замера")
+    serialize.set_defaults(func=bench_serialize)
+
+    writes = subparsers.add_parser("writes", help="записей в секунду с групповой фиксацией и без")
+    writes.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    writes.add_argument("--writes", type=int, default=500, help="записей на поток")
+    writes.add_argument("--requests", type=int, default=10_000, help="заявок в генерируемой БД")
+    writes.add_argument("--seed", type=int, default=0)
+    writes.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"],
+                        help="PRAGMA synchronous соединений (FULL - fsync на каждую фиксацию)")
+    writes.set_defaults(func=bench_writes)
+
+    api = subparsers.add_parser("api", help="сценарии API: RPS, задержки, пиковый RSS (JSON для сравнения)")
+    api.add_argument("--requests", type=int, default=100_000, help="заявок в генерируемой БД")
+    api.add_argument("--seed", type=int, default=0, help="seed генерации данных и запросов")
+    api.add_argument("--specialists", type=int, default=20)
+    api.add_argument("--clients", type=int, default=1000)
+    api.add_argument("--iterations", type=int, default=500, help="запросов на сценарий")
+    api.add_argument("--login-iterations", type=int, default=50, help="входов (bcrypt медленный)")
+    api.add_argument("--warmup", type=int, default=20, help="запросов прогрева на сценарий")
+    api.add_argument("--concurrency", type=int, default=8)
+    api.add_argument("--rounds", type=int, default=10, help="стоимость bcrypt для замера")
+    api.add_argument("--scenarios", nargs="+", help="только указанные сценарии")
+    api.add_argument("--output", help="сохранить результаты в JSON")
+    api.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    api.add_argument("--max-regression", type=float, default=20.0,
+                     help="допустимое ухудшение p95 или RPS, %% (иначе код возврата 1)")
+    api.add_argument("--sql-trace", action="store_true", help="трассировка SQL и планы медленных запросов")
+    api.add_argument("--slow-ms", type=float, default=10.0, help="порог медленного запроса для --sql-trace, мс")
+    api.set_defaults(func=bench_api)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
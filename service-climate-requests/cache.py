@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Кэш в памяти процесса с TTL и stale-while-revalidate.
+
+    Свежее значение (моложе ttl) отдается сразу. Устаревшее, но моложе
+    ttl + stale_ttl, тоже отдается сразу, а обновление запускается в
+    фоновом потоке. Более старое значение загружается синхронно.
+    clear() сбрасывает все значения: следующий запрос читает из БД.
+
+    version - функция текущей версии данных (например,
+    database.get_data_version). Значение, загруженное при другой версии,
+    не отдается даже в пределах TTL: изменения, сделанные другими
+    процессами, видны сразу, а ответ соответствует версии в его ETag.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, version: Optional[Callable[[], Hashable]] = None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.version = version
+        self._entries: Dict[Hashable, tuple] = {}  # ключ -> (значение, время загрузки, версия)
+        self._refreshing = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Получить значение по ключу, при необходимости загрузив его через loader"""
+        # Версия читается до загрузки: изменения во время загрузки дадут новую версию
+        version = self.version() if self.version is not None else None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation
+            if entry is not None and entry[2] == version:
+                value, loaded_at, _ = entry
+                age = now - loaded_at
+                if age < self.ttl:
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(
+                            target=self._refresh, args=(key, loader, generation, version), daemon=True
+                        ).start()
+                    return value
+
+        value = loader()
+        self._store(key, value, generation, version)
+        return value
+
+    def clear(self):
+        """Сбросить все значения (после изменения данных)"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], generation: int, version: Hashable):
+        try:
+            self._store(key, loader(), generation, version)
+        except Exception:
+            # Оставляем устаревшее значение, повторим при следующем запросе
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key: Hashable, value: Any, generation: int, version: Hashable):
+        with self._lock:
+            # Значение, загруженное до clear(), может быть уже неактуальным
+            if generation == self._generation:
+                self._entries[key] = (value, time.monotonic(), version)
+
+
+class LRUCache:
+    """Ограниченный LRU-кэш с индивидуальным сроком жизни записей.
+
+    Срок задается абсолютным временем (time.time()), например
+    полем exp JWT-токена. При переполнении вытесняются давно
+    не использовавшиеся записи.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # ключ -> (значение, срок)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Значение по ключу или None, если его нет или срок истек"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """Сохранить значение до expires_at (по умолчанию - на ttl секунд)"""
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        """Удалить значение по ключу"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Удалить все значения"""
+        with self._lock:
+            self._entries.clear()
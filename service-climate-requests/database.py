@@ -1,28 +1,538 @@
+import asyncio
+import contextvars
+import functools
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
 
+import problem_categories
+import sqltrace
+
 DATABASE_PATH = "repair_requests.db"
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# Настройки пула и соединений (PRAGMA применяются один раз при открытии)
+POOL_SIZE = 16
+POOL_TIMEOUT_SECONDS = 30
+DB_EXECUTOR_WORKERS = POOL_SIZE
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 64 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+# Групповая фиксация записей (см. WriteQueue), включается GROUP_COMMIT=1. По умолчанию
+# каждая запись в своей транзакции: при одном писателе очередь медленнее (лишняя
+# передача между потоками), выигрыш - при многих параллельных писателях и дорогом fsync
+GROUP_COMMIT = os.environ.get("GROUP_COMMIT", "0") == "1"
+WRITE_BATCH_SIZE = 256
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+# ---------- УЧЕТ ЗАПРОСОВ ----------
+
+class QueryStats:
+    """Число запросов к БД и их суммарное время в рамках одного HTTP-запроса"""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Счетчик текущего HTTP-запроса (устанавливает metrics.MetricsMiddleware).
+# Контекст копируется в потоки обработчиков и run_in_db_executor, а объект
+# счетчика общий, поэтому запросы из этих потоков тоже учитываются.
+current_query_stats = contextvars.ContextVar("current_query_stats", default=None)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, учитывающий запросы и время выполнения в current_query_stats.
+
+    Время выборки (fetch*) прибавляется к времени запроса; вне HTTP-запроса
+    накладные расходы - одно чтение контекстной переменной. При включенной
+    трассировке запросы выполняются через sqltrace.trace_call.
+    """
+
+    def _timed(self, method, args, is_query: bool):
+        stats = current_query_stats.get()
+        traced = is_query and sqltrace.ENABLED
+        if stats is None and not traced:
+            return method(*args)
+        started = time.perf_counter()
+        try:
+            if traced:
+                return sqltrace.trace_call(self.connection, method, args)
+            return method(*args)
+        finally:
+            if stats is not None:
+                stats.seconds += time.perf_counter() - started
+                if is_query:
+                    stats.count += 1
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, (sql, parameters), True)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, (sql, seq_of_parameters), True)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, (sql_script,), True)
+
+    def fetchone(self):
+        return self._timed(super().fetchone, (), False)
+
+    def fetchmany(self, *args):
+        return self._timed(super().fetchmany, args, False)
+
+    def fetchall(self):
+        return self._timed(super().fetchall, (), False)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого - InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute* в CPython не вызывают Cursor.execute подкласса
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def open_connection(path: str = None) -> sqlite3.Connection:
+    """Открыть новое настроенное соединение с БД"""
+    conn = sqlite3.connect(
+        path or DATABASE_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=InstrumentedConnection
+    )
+    conn.row_factory = sqlite3.Row  # Для доступа по именам колонок
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# Колонки, добавленные в уже существующие таблицы: (таблица, колонка, определение).
+# В schema.sql они есть в CREATE TABLE для новых БД.
+COLUMN_MIGRATIONS = (
+    ("requests", "problem_category_id",
+     "INTEGER REFERENCES problem_categories(category_id) ON DELETE SET NULL"),
+)
+
+
+def apply_column_migrations(conn: sqlite3.Connection):
+    """Добавить недостающие колонки в существующие таблицы"""
+    for table, column, definition in COLUMN_MIGRATIONS:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if columns and column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def init_db(path: str = None):
+    """Применить schema.sql (идемпотентно: таблицы, индексы)"""
+    with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+        sql = f.read()
+    conn = open_connection(path)
+    try:
+        apply_column_migrations(conn)
+        conn.executescript(sql)
+    finally:
+        conn.close()
+
+
+# ---------- ПУЛ СОЕДИНЕНИЙ ----------
+
+class ConnectionPool:
+    """Ограниченный пул соединений с одной БД"""
+
+    def __init__(self, path: str, max_size: int = POOL_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._idle = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float = POOL_TIMEOUT_SECONDS) -> sqlite3.Connection:
+        """Взять соединение из пула (или открыть новое, если лимит не исчерпан)"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Пул соединений закрыт")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.max_size:
+                    self._created += 1
+                    break
+                if not self._cond.wait(timeout):
+                    raise sqlite3.OperationalError("Нет свободных соединений с БД")
+        try:
+            return open_connection(self.path)
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """Вернуть соединение в пул"""
+        with self._cond:
+            if discard or self._closed:
+                self._created -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        """Закрыть все свободные соединения; занятые закроются при возврате"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+
+_pool = None
+_executor = None
+_write_queue = None
+_version_conn = None  # (путь, соединение) для get_data_version
+_pool_lock = threading.Lock()
+_version_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_pool() -> ConnectionPool:
+    """Пул для текущего DATABASE_PATH (пересоздается, если путь поменялся)"""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.path == DATABASE_PATH:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DATABASE_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE_PATH)
+        return _pool
+
+
+def close_all_connections():
+    """Закрыть пул соединений и пул потоков БД (при остановке приложения)"""
+    global _pool, _executor, _version_conn, _write_queue
+    with _version_lock:
+        if _version_conn is not None:
+            _version_conn[1].close()
+            _version_conn = None
+    with _pool_lock:
+        if _write_queue is not None:
+            _write_queue.close()
+            _write_queue = None
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def discard_rolled_back_state():
+    """Сбросить кэши процесса, которые могли увидеть откаченные изменения.
+
+    Индекс категорий догружается в транзакции записи и может содержать
+    категории, созданные этой же транзакцией; после отката их ID
+    недействительны (и будут выданы заново другим категориям).
+    """
+    problem_categories.reset_index()
+
+
+def after_commit(callback):
+    """Вызвать callback() после фиксации транзакции соединения потока.
+
+    Вне get_db_connection() (и вне задания очереди писателя) callback
+    вызывается сразу; при откате транзакции он отбрасывается. Так запись,
+    выполненная во вложенном run_write, объявляется только после фиксации
+    внешней транзакции.
+    """
+    pending = getattr(_local, "after_commit", None)
+    if getattr(_local, "conn", None) is None or pending is None:
+        callback()
+    else:
+        pending.append(callback)
+
 
 @contextmanager
 def get_db_connection():
-    """Контекстный менеджер для подключения к БД"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # Для доступа по именам колонок
+    """Контекстный менеджер для соединения с БД из пула.
+
+    Вложенные вызовы в одном потоке получают то же соединение,
+    фиксация транзакции выполняется внешним вызовом.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    _local.conn = conn
+    _local.after_commit = callbacks = []
+    broken = False
     try:
         yield conn
-        conn.commit()
+        if conn.in_transaction:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            broken = True
+        discard_rolled_back_state()
         raise
     finally:
-        conn.close()
+        _local.conn = None
+        _local.after_commit = None
+        pool.release(conn, discard=broken)
+    for callback in callbacks:
+        callback()
+
 
 @contextmanager
 def get_db_cursor():
-    """Контекстный менеджер для курсора БД"""
+    """Контекстный менеджер для работы с курсором БД"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
         try:
-            yield cursor
+            yield cursor, conn
         finally:
-            cursor.close()
\ No newline at end of file
+            cursor.close()
+
+
+# ---------- ГРУППОВАЯ ФИКСАЦИЯ ЗАПИСЕЙ ----------
+
+class WriteQueue:
+    """Очередь записей с одним потоком-писателем и групповой фиксацией.
+
+    Задания, накопившиеся в очереди, пока писатель фиксировал предыдущую
+    пачку, выполняются в одной транзакции (BEGIN IMMEDIATE ... COMMIT):
+    блокировка записи берется и fsync выполняется один раз на пачку, а
+    конкурирующих писателей, получающих "database is locked", нет.
+    Каждое задание выполняется в своей точке сохранения, поэтому ошибка
+    откатывает только его, и вызывающий получает свой результат или
+    исключение. Если не удалась сама фиксация, ошибку получают все задания
+    пачки.
+
+    Задание выполняется в контексте (contextvars) вызывающего, поэтому
+    его запросы учитываются в метриках HTTP-запроса.
+    """
+
+    def __init__(self, path: str, max_batch: int = WRITE_BATCH_SIZE):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        """Поставить в очередь func(*args, **kwargs); результат - после фиксации.
+
+        sqlite3.ProgrammingError, если очередь уже закрыта (задание никто не выполнил бы).
+        """
+        future = Future()
+        context = contextvars.copy_context()
+        with self._close_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Очередь записей закрыта")
+            self._queue.put((future, functools.partial(context.run, func), args, kwargs))
+        return future
+
+    def close(self):
+        """Выполнить оставшиеся задания и остановить поток-писатель"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        conn = error = None
+        try:
+            conn = open_connection(self.path)
+        except Exception as e:
+            error = e
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if conn is None:
+                for future, *_ in batch:
+                    future.set_exception(error)
+            else:
+                self._execute_batch(conn, batch)
+            if stop:
+                break
+        if conn is not None:
+            conn.close()
+
+    def _execute_batch(self, conn: sqlite3.Connection, batch: list):
+        results = []
+        # Вложенные get_db_connection() в заданиях получают соединение писателя
+        _local.conn = conn
+        _local.after_commit = callbacks = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, func, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_job")
+                job_callbacks = len(callbacks)
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_job")
+                    discard_rolled_back_state()
+                    del callbacks[job_callbacks:]
+                    results.append((future, None, e))
+                else:
+                    results.append((future, result, None))
+                conn.execute("RELEASE write_job")
+            conn.commit()
+        except Exception as e:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                pass
+            discard_rolled_back_state()
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            _local.conn = None
+            _local.after_commit = None
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # Записи уже зафиксированы, ошибка уведомления не должна останавливать писателя
+                pass
+
+
+def get_write_queue() -> WriteQueue:
+    """Очередь записей для текущего DATABASE_PATH (пересоздается, если путь поменялся)"""
+    global _write_queue
+    write_queue = _write_queue
+    if write_queue is not None and write_queue.path == DATABASE_PATH:
+        return write_queue
+    with _pool_lock:
+        if _write_queue is None or _write_queue.path != DATABASE_PATH:
+            if _write_queue is not None:
+                _write_queue.close()
+            _write_queue = WriteQueue(DATABASE_PATH)
+        return _write_queue
+
+
+def run_write(func, *args, **kwargs):
+    """Выполнить запись func(*args, **kwargs) и дождаться фиксации.
+
+    func работает через get_db_cursor()/get_db_connection() и не вызывает
+    commit(). С GROUP_COMMIT=1 запись идет через очередь писателя, иначе -
+    в отдельной транзакции на соединении из пула. Внутри уже открытого
+    соединения (вложенный вызов) func выполняется в транзакции вызывающего
+    и фиксируется вместе с ней; действия, которые должны следовать за
+    фиксацией, откладываются через after_commit().
+    """
+    if not GROUP_COMMIT or getattr(_local, "conn", None) is not None:
+        with get_db_connection():
+            return func(*args, **kwargs)
+    return get_write_queue().submit(func, *args, **kwargs).result()
+
+
+# ---------- ВЕРСИЯ ДАННЫХ ----------
+
+def get_data_version() -> int:
+    """Номер версии данных БД (PRAGMA data_version отдельного соединения).
+
+    Соединение только читает версию и никогда не пишет, поэтому значение
+    меняется после каждой фиксации любым соединением, в том числе из
+    других процессов. Значения сравнимы только в пределах процесса.
+    """
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None or _version_conn[0] != DATABASE_PATH:
+            if _version_conn is not None:
+                _version_conn[1].close()
+            conn = sqlite3.connect(DATABASE_PATH, isolation_level=None, check_same_thread=False)
+            _version_conn = (DATABASE_PATH, conn)
+        return _version_conn[1].execute("PRAGMA data_version").fetchone()[0]
+
+
+# ---------- АСИНХРОННЫЙ ДОСТУП ----------
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Пул потоков для обращений к БД из асинхронного кода.
+
+    Размер совпадает с пулом соединений: лишние потоки только ждали бы
+    свободного соединения.
+    """
+    global _executor
+    executor = _executor
+    if executor is not None:
+        return executor
+    with _pool_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+        return _executor
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Выполнить блокирующую функцию работы с БД в пуле потоков БД.
+
+    Контекстные переменные вызывающей корутины передаются в поток.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_db_executor(), call)
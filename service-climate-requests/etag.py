@@ -0,0 +1,96 @@
+"""Условные GET-запросы: ETag и If-None-Match по версии данных БД.
+
+ETag ответа строится из версии данных (database.get_data_version),
+эпохи процесса, токена и URL. Пока данные не менялись, повторный GET с
+If-None-Match получает 304 Not Modified до вызова обработчика: без
+запросов к БД и без сериализации JSON.
+"""
+import hashlib
+import secrets
+from typing import Callable
+
+import database
+
+# Эпоха процесса: версии данных разных процессов между собой не сравнимы
+PROCESS_EPOCH = secrets.token_hex(8)
+
+# GET-эндпоинты с ETag (путь и вложенные пути); потоковая выгрузка - без ETag.
+# Ответ должен зависеть только от данных БД той же версии: /me отдается из
+# кэша пользователей процесса (models.user_cache), который версию не проверяет
+ETAG_PATH_PREFIXES = ("/requests", "/comments", "/search", "/stats", "/users")
+ETAG_EXCLUDED_PATHS = ("/requests/export",)
+
+
+def is_etag_path(path: str) -> bool:
+    """Поддерживает ли эндпоинт условные запросы"""
+    if path in ETAG_EXCLUDED_PATHS:
+        return False
+    return any(path == prefix or path.startswith(prefix + "/") for prefix in ETAG_PATH_PREFIXES)
+
+
+def make_etag(version: int, token: str, path: str, query: bytes) -> str:
+    """ETag ответа для версии данных, пользователя (токена) и URL"""
+    digest = hashlib.sha1(
+        f"{PROCESS_EPOCH}:{version}:{token}:{path}?".encode("utf-8") + query
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Совпадает ли ETag с одним из значений If-None-Match"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag or candidate == "*":
+            return True
+    return False
+
+
+class ETagMiddleware:
+    """ASGI-middleware: ETag для успешных GET и 304 при совпадении If-None-Match.
+
+    304 отдается только для токена, который уже проверен и не истек
+    (is_token_valid), иначе запрос проходит обычную проверку доступа.
+    """
+
+    def __init__(self, app, is_token_valid: Callable[[str], bool]):
+        self.app = app
+        self.is_token_valid = is_token_valid
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not is_etag_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            await self.app(scope, receive, send)
+            return
+
+        # Версия читается до обработки: изменения во время запроса дадут новый ETag.
+        # Запрос к SQLite блокирующий - выполняется в пуле потоков БД, не в цикле событий
+        version = await database.run_in_db_executor(database.get_data_version)
+        etag = make_etag(version, token, scope["path"], scope["query_string"])
+        etag_header = etag.encode("latin-1")
+
+        if_none_match = headers.get(b"if-none-match")
+        if if_none_match and etag_matches(if_none_match.decode("latin-1"), etag) and self.is_token_valid(token):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", etag_header), (b"cache-control", b"no-cache")],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"etag", etag_header), (b"cache-control", b"no-cache")
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
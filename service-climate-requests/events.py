@@ -0,0 +1,146 @@
+"""Уведомления об изменениях заявок для потока Server-Sent Events (/events).
+
+Функции записи models.py после фиксации публикуют событие в Broadcaster
+процесса; каждое соединение /events подписано со своим фильтром по роли
+и получает только события, которые пользователь вправе видеть. Публикация
+идет из любых потоков (обработчики, писатель БД), доставка - в цикл
+событий подписчика через call_soon_threadsafe.
+
+ID события - "<эпоха процесса>-<номер>": номера начинаются заново после
+перезапуска, эпоха отличает их от прежних. Последние события хранятся в
+кольцевом буфере, поэтому переподключившийся клиент с Last-Event-ID
+получает пропущенное; если ID из другой эпохи, неизвестен или старше
+буфера, клиент получает событие resync и перечитывает данные целиком.
+Брокер локален для процесса: с несколькими воркерами uvicorn подписчик
+видит изменения, сделанные своим воркером.
+"""
+import asyncio
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+HISTORY_SIZE = 1000
+
+REQUEST_CREATED = "request_created"
+REQUEST_UPDATED = "request_updated"
+REQUEST_DELETED = "request_deleted"
+COMMENT_CREATED = "comment_created"
+# Пропущенные события недоступны - клиенту нужно перечитать данные
+RESYNC = "resync"
+
+# Эпоха процесса в ID событий
+EPOCH = secrets.token_hex(4)
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[int]:
+    """Номер события по его ID; None - ID не из этой эпохи процесса или некорректен"""
+    epoch, _, number = (event_id or "").partition("-")
+    if epoch != EPOCH or not number.isdigit():
+        return None
+    return int(number)
+
+
+def is_visible(event: Dict, role: str, user_id: int) -> bool:
+    """Может ли пользователь видеть событие (те же правила, что у GET /requests)"""
+    if role == "Заказчик":
+        return event.get("client_id") == user_id
+    if role == "Специалист":
+        return user_id in (event.get("master_id"), event.get("previous_master_id"))
+    return True
+
+
+class Subscription:
+    """Очередь событий одного подписчика в его цикле событий"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, accepts: Callable[[Dict], bool]):
+        self.loop = loop
+        self.accepts = accepts
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event: Dict):
+        """Положить событие в очередь (вызывается в цикле событий подписчика)"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: очередь сбрасывается, поток закрывается,
+            # клиент переподключится с Last-Event-ID
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[Dict]:
+        """Следующее событие; None - подписка переполнена и поток нужно закрыть"""
+        return await self.queue.get()
+
+
+class Broadcaster:
+    """Рассылка событий подписчикам из любых потоков"""
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self._subscribers: List[Subscription] = []
+        self._history = deque(maxlen=history_size)  # (номер, событие)
+        self._last_number = 0
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, **fields) -> Dict:
+        """Опубликовать событие; возвращает его с присвоенным id"""
+        event = {"type": event_type, **fields, "ts": time.time()}
+        with self._lock:
+            # Номер присваивается и доставка планируется под одной блокировкой,
+            # поэтому подписчики получают события в порядке номеров
+            self._last_number += 1
+            event["id"] = f"{EPOCH}-{self._last_number}"
+            self._history.append((self._last_number, event))
+            for subscription in list(self._subscribers):
+                if not subscription.accepts(event):
+                    continue
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                except RuntimeError:
+                    # Цикл событий подписчика уже закрыт
+                    self._subscribers.remove(subscription)
+        return event
+
+    def subscribe(self, accepts: Callable[[Dict], bool], last_event_id: Optional[str] = None) -> Subscription:
+        """Подписаться из текущего цикла событий; с last_event_id - и на пропущенные события"""
+        subscription = Subscription(asyncio.get_running_loop(), accepts)
+        with self._lock:
+            self._subscribers.append(subscription)
+            missed = []
+            if last_event_id is not None:
+                number = parse_event_id(last_event_id)
+                oldest = self._history[0][0] if self._history else self._last_number + 1
+                if number is None or number > self._last_number or number + 1 < oldest:
+                    missed.append({"type": RESYNC, "id": f"{EPOCH}-{self._last_number}", "ts": time.time()})
+                else:
+                    missed.extend(event for event_number, event in self._history
+                                  if event_number > number and accepts(event))
+        # Доставка пропущенного идет раньше событий, опубликованных после
+        # подписки: те попадут в цикл событий через call_soon_threadsafe
+        for event in missed:
+            subscription.deliver(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+broadcaster = Broadcaster()
+
+
+def publish(event_type: str, **fields) -> Dict:
+    """Опубликовать событие в брокере процесса"""
+    return broadcaster.publish(event_type, **fields)
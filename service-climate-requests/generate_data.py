@@ -0,0 +1,343 @@
+# generate_data.py
+"""Генератор синтетических данных в объеме продакшена.
+
+Пользователи, заявки и комментарии по schema.sql с ролями и статусами
+из main.py и gui.py. Распределения неравномерные, как в реальной
+работе сервиса: типы оборудования, модели, неисправности, специалисты
+и заказчики выбираются по убывающим весам (Zipf), число заявок растет
+со временем, статус и дата выполнения зависят от возраста заявки.
+Одинаковый seed дает одинаковые данные.
+
+Данные пишутся прямо в SQLite (с отложенными индексами и триггерами,
+как в import_data.py) или в CSV в формате inputData*.csv. Пароли -
+открытым текстом pass<ID> (как в inputDataUsers.csv), при первом входе
+они перехэшируются.
+
+    python generate_data.py --db big.db --requests 1000000
+    python generate_data.py --csv-dir data --requests 100000 --clients 20000 --seed 42
+"""
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate, islice
+
+import database
+import import_data
+import problem_categories
+
+BATCH_SIZE = 50_000
+
+ROLES = ("Менеджер", "Оператор", "Специалист", "Заказчик")
+STATUSES = ("Новая заявка", "В процессе ремонта", "Ожидание комплектующих", "Готова к выдаче", "Завершена")
+COMPLETED_STATUSES = ("Готова к выдаче", "Завершена")
+
+# Тип оборудования -> (вес, модели, неисправности)
+TECH_TYPES = {
+    "Кондиционер": (45, (
+        "TCL TAC-12CHSA/TPG-W белый", "Electrolux EACS/I-09HAT/N3_21Y белый", "Ballu BSD-07HN1",
+        "Haier HSU-09HTT03/R2", "Samsung AR09TXHQASINUA", "LG P07EP2", "Daikin FTXB20C",
+        "Mitsubishi Electric MSZ-HR25VF", "Gree GWH09AAA-K3NNA2A", "Royal Clima RC-V29HN",
+    ), (
+        "Не охлаждает воздух", "Выключается сам по себе", "Протекает вода из внутреннего блока",
+        "Сильно шумит при работе", "Не работает пульт", "Пахнет сыростью", "Не греет в зимнем режиме",
+        "Выдает код ошибки на дисплее", "Обмерзает наружный блок", "Не включается",
+    )),
+    "Увлажнитель воздуха": (15, (
+        "Xiaomi Smart Humidifier 2", "Polaris PUH 2300 WIFI IQ Home", "Boneco S250",
+        "Ballu UHB-400", "Electrolux EHU-3715D",
+    ), (
+        "Пар имеет неприятный запах",
+        "Увлажнитель воздуха продолжает работать при предельном снижении уровня воды",
+        "Не выходит пар", "Протекает резервуар", "Не работает датчик влажности", "Не включается",
+    )),
+    "Обогреватель": (14, (
+        "Ballu BEC/EZER-1500", "Timberk TEC.PF8N M 2000 IN", "Electrolux EIH/AG2-1500E", "Polaris PMH 2095",
+    ), (
+        "Не греет", "Пахнет гарью", "Отключается через несколько минут", "Не работает термостат",
+        "Щелкает при нагреве",
+    )),
+    "Вентилятор": (10, (
+        "Xiaomi Mi Smart Standing Fan 2", "Polaris PSF 40RC", "Scarlett SC-SF111B05", "Vitek VT-1949",
+    ), (
+        "Не вращаются лопасти", "Сильно шумит при работе", "Не работает пульт", "Не поворачивается",
+    )),
+    "Очиститель воздуха": (8, (
+        "Xiaomi Mi Air Purifier 3H", "Philips AC0820/10", "Tefal Pure Air PT3080",
+    ), (
+        "Не работает датчик качества воздуха", "Сильно шумит при работе", "Не включается",
+        "Требуется замена фильтра",
+    )),
+    "Сушилка для рук": (8, (
+        "Ballu BAHD-1250", "Dyson Airblade V", "Electrolux EHDA/N-2500",
+    ), (
+        "Не работает", "Не срабатывает датчик рук", "Слабый поток воздуха",
+    )),
+}
+
+# Варианты формулировок одной неисправности (для кластеризации problem_categories)
+PROBLEM_SUFFIXES = ("", "", "", "", " после чистки", " иногда", " уже неделю", "!", " после переезда")
+
+REPAIR_PARTS = ("", "", "", "Фильтр", "Пульт ДУ", "Датчик влажности", "Вентилятор внутреннего блока",
+                "Плата управления", "Компрессор", "Термостат", "Фреон R32", "Дренажный насос")
+
+COMMENT_MESSAGES = (
+    "Всё сделаем!", "Починим в момент.", "Мы всё термоядерно исправим!", "Заказали комплектующие",
+    "Запчасти пришли, приступаю к ремонту", "Требуется выезд на объект", "Клиент не отвечает на звонки",
+    "Провели диагностику", "Заменили деталь, идет проверка", "Готово, можно забирать",
+)
+
+LAST_NAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+              "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров")
+FIRST_NAMES = ("Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артем", "Илья",
+               "Кирилл", "Михаил", "Никита", "Матвей", "Роман", "Егор", "Василий", "Иван")
+MIDDLE_NAMES = ("Александрович", "Дмитриевич", "Сергеевич", "Андреевич", "Иванович", "Михайлович",
+                "Петрович", "Николаевич", "Владимирович", "Матвеевич")
+
+
+def zipf_cum_weights(n: int, s: float = 1.0) -> list:
+    """Накопленные веса Zipf для n элементов (первые выбираются чаще)"""
+    return list(accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+class DataGenerator:
+    """Воспроизводимый по seed источник строк users, requests, comments"""
+
+    def __init__(self, seed: int = 0, managers: int = 3, operators: int = 10, specialists: int = 100,
+                 clients: int = 50_000, requests: int = 1_000_000, comments_per_request: float = 1.5,
+                 first_day: date = date(2019, 1, 1), last_day: date = date(2024, 12, 31)):
+        self.rng = random.Random(seed)
+        self.requests = requests
+        self.comments_per_request = comments_per_request
+        self.first_day = first_day
+        self.last_day = last_day
+        self.span_days = (last_day - first_day).days
+        if self.span_days <= 0:
+            raise ValueError("Дата последней заявки должна быть позже даты первой")
+
+        counts = ((ROLES[0], managers), (ROLES[1], operators), (ROLES[2], specialists), (ROLES[3], clients))
+        self.user_roles = []
+        for role, count in counts:
+            self.user_roles.extend([role] * count)
+        first_specialist = 1 + managers + operators
+        self.specialist_ids = list(range(first_specialist, first_specialist + specialists))
+        self.client_ids = list(range(first_specialist + specialists, 1 + len(self.user_roles)))
+        if not self.specialist_ids or not self.client_ids:
+            raise ValueError("Нужен хотя бы один специалист и один заказчик")
+
+        # Часть специалистов загружена сильнее, часть заказчиков - корпоративные клиенты
+        self.specialist_weights = zipf_cum_weights(len(self.specialist_ids), 0.8)
+        self.client_weights = zipf_cum_weights(len(self.client_ids), 0.7)
+        self.tech_types = list(TECH_TYPES)
+        self.tech_weights = list(accumulate(TECH_TYPES[t][0] for t in self.tech_types))
+        self.model_weights = {t: zipf_cum_weights(len(TECH_TYPES[t][1])) for t in self.tech_types}
+        self.problem_weights = {t: zipf_cum_weights(len(TECH_TYPES[t][2]), 1.2) for t in self.tech_types}
+
+    def users(self):
+        """Строки users: (user_id, fio, phone, login, password, role)"""
+        rng = self.rng
+        for user_id, role in enumerate(self.user_roles, start=1):
+            fio = f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(MIDDLE_NAMES)}"
+            yield (user_id, fio, f"89{rng.randrange(10 ** 9):09d}", f"login{user_id}", f"pass{user_id}", role)
+
+    def start_day(self) -> int:
+        """День заявки от first_day: плотность растет к last_day (рост сервиса)"""
+        day = int(self.span_days * self.rng.random() ** 0.5)
+        # В выходные заявок меньше
+        if (self.first_day.toordinal() + day) % 7 in (0, 6) and self.rng.random() < 0.5:
+            day = int(self.span_days * self.rng.random() ** 0.5)
+        return day
+
+    def status_for_age(self, age_days: int) -> str:
+        """Статус с учетом возраста заявки: старые почти все выполнены"""
+        r = self.rng.random()
+        if age_days > 90:
+            return "Завершена" if r < 0.93 else "Готова к выдаче" if r < 0.97 else "Ожидание комплектующих"
+        if age_days > 14:
+            return ("Завершена" if r < 0.55 else "Готова к выдаче" if r < 0.7
+                    else "Ожидание комплектующих" if r < 0.85 else "В процессе ремонта")
+        return ("Новая заявка" if r < 0.35 else "В процессе ремонта" if r < 0.65
+                else "Ожидание комплектующих" if r < 0.8 else "Готова к выдаче" if r < 0.92 else "Завершена")
+
+    def requests_and_comments(self):
+        """Пары (строка requests, список строк comments) в порядке request_id"""
+        rng = self.rng
+        choices = rng.choices
+        first_ordinal = self.first_day.toordinal()
+        comment_rate = 1.0 / self.comments_per_request if self.comments_per_request > 0 else None
+        comment_id = 0
+
+        for request_id in range(1, self.requests + 1):
+            day = self.start_day()
+            start = date.fromordinal(first_ordinal + day)
+            status = self.status_for_age(self.span_days - day)
+            tech_type = choices(self.tech_types, cum_weights=self.tech_weights)[0]
+            _, models, problems = TECH_TYPES[tech_type]
+            model = choices(models, cum_weights=self.model_weights[tech_type])[0]
+            problem = choices(problems, cum_weights=self.problem_weights[tech_type])[0] + rng.choice(PROBLEM_SUFFIXES)
+
+            completion = None
+            repair_parts = ""
+            end_day = self.span_days
+            if status in COMPLETED_STATUSES:
+                # Логнормальная длительность ремонта: обычно дни, иногда месяцы
+                end_day = min(self.span_days, day + 1 + int(rng.lognormvariate(1.6, 0.9)))
+                completion = date.fromordinal(first_ordinal + end_day).isoformat()
+                repair_parts = rng.choice(REPAIR_PARTS)
+            master_id = None
+            if status != "Новая заявка" or rng.random() < 0.2:
+                master_id = choices(self.specialist_ids, cum_weights=self.specialist_weights)[0]
+            client_id = choices(self.client_ids, cum_weights=self.client_weights)[0]
+
+            request = (request_id, start.isoformat(), tech_type, model, problem, status,
+                       completion, repair_parts, master_id, client_id)
+
+            comments = []
+            if master_id is not None and comment_rate is not None:
+                for _ in range(int(rng.expovariate(comment_rate) + 0.5)):
+                    comment_id += 1
+                    created = datetime.fromordinal(first_ordinal + rng.randint(day, end_day)) \
+                        + timedelta(seconds=rng.randrange(9 * 3600, 19 * 3600))
+                    comments.append((comment_id, rng.choice(COMMENT_MESSAGES), master_id, request_id,
+                                     created.strftime("%Y-%m-%d %H:%M:%S")))
+            yield request, comments
+
+
+USERS_INSERT = "INSERT INTO users (user_id, fio, phone, login, password, role) VALUES (?, ?, ?, ?, ?, ?)"
+REQUESTS_INSERT = """
+    INSERT INTO requests (request_id, start_date, climate_tech_type, climate_tech_model,
+                          problem_description, request_status, completion_date, repair_parts,
+                          master_id, client_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+COMMENTS_INSERT = "INSERT INTO comments (comment_id, message, master_id, request_id, created_at) VALUES (?, ?, ?, ?, ?)"
+
+
+def write_sqlite(generator: DataGenerator, path: str) -> dict:
+    """Записать данные в БД (пустую или новую), вернуть число строк по таблицам"""
+    database.init_db(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute(f"PRAGMA cache_size = -{database.CACHE_SIZE_KB * 4}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    counts = {"users": 0, "requests": 0, "comments": 0}
+    try:
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM users UNION ALL SELECT 1 FROM requests)").fetchone()[0]:
+            raise ValueError(f"{path}: БД не пуста, генерация - только в новую БД")
+        # Без индексов и триггеров вставка в разы быстрее; init_db восстановит их
+        import_data.drop_deferred_objects(conn)
+        conn.execute("BEGIN")
+        conn.executemany(USERS_INSERT, generator.users())
+        counts["users"] = len(generator.user_roles)
+
+        pairs = generator.requests_and_comments()
+        while True:
+            batch = list(islice(pairs, BATCH_SIZE))
+            if not batch:
+                break
+            conn.executemany(REQUESTS_INSERT, [request for request, _ in batch])
+            comments = [comment for _, request_comments in batch for comment in request_comments]
+            conn.executemany(COMMENTS_INSERT, comments)
+            counts["requests"] += len(batch)
+            counts["comments"] += len(comments)
+        problem_categories.backfill_categories(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        import_data.abort_load(conn, path)
+        raise
+    finally:
+        conn.close()
+
+    # Индексы, триггеры, счетчики статистики и полнотекстовые индексы - по schema.sql
+    database.init_db(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return counts
+
+
+def csv_value(value) -> str:
+    """Значение для CSV: NULL -> 'null', как в inputData*.csv"""
+    return "null" if value is None else value
+
+
+def write_csv(generator: DataGenerator, directory: str) -> dict:
+    """Записать inputDataUsers.csv, inputDataRequests.csv, inputDataComments.csv в каталог"""
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    for table, mapping in import_data.IMPORT_ORDER:
+        f = open(os.path.join(directory, f"inputData{table.capitalize()}.csv"), "w", encoding="utf-8", newline="")
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(list(mapping))  # заголовки CSV в порядке колонок вставки
+        files[table] = (f, writer)
+
+    counts = {"users": 0, "requests": 0, "comments": 0}
+    try:
+        files["users"][1].writerows(generator.users())
+        counts["users"] = len(generator.user_roles)
+        pairs = generator.requests_and_comments()
+        while True:
+            batch = list(islice(pairs, BATCH_SIZE))
+            if not batch:
+                break
+            files["requests"][1].writerows([csv_value(v) for v in request] for request, _ in batch)
+            comments = [comment for _, request_comments in batch for comment in request_comments]
+            files["comments"][1].writerows(comments)
+            counts["requests"] += len(batch)
+            counts["comments"] += len(comments)
+    finally:
+        for f, _ in files.values():
+            f.close()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных для БД заявок")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", help="записать в новую БД SQLite")
+    target.add_argument("--csv-dir", help="записать inputData*.csv в каталог")
+    parser.add_argument("--seed", type=int, default=0, help="seed (одинаковый seed - одинаковые данные)")
+    parser.add_argument("--requests", type=int, default=1_000_000, help="число заявок")
+    parser.add_argument("--comments-per-request", type=float, default=1.5,
+                        help="среднее число комментариев на заявку со специалистом")
+    parser.add_argument("--managers", type=int, default=3)
+    parser.add_argument("--operators", type=int, default=10)
+    parser.add_argument("--specialists", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=50_000)
+    parser.add_argument("--first-day", type=date.fromisoformat, default=date(2019, 1, 1),
+                        help="дата первой заявки (YYYY-MM-DD)")
+    parser.add_argument("--last-day", type=date.fromisoformat, default=date(2024, 12, 31),
+                        help="дата последней заявки (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        generator = DataGenerator(
+            seed=args.seed, managers=args.managers, operators=args.operators, specialists=args.specialists,
+            clients=args.clients, requests=args.requests, comments_per_request=args.comments_per_request,
+            first_day=args.first_day, last_day=args.last_day,
+        )
+        if args.db:
+            counts = write_sqlite(generator, args.db)
+        else:
+            counts = write_csv(generator, args.csv_dir)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Ошибка генерации: {e}", file=sys.stderr)
+        return 1
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(", ".join(f"{table}: {count}" for table, count in counts.items()))
+    print(f"Итого: {total} строк за {elapsed:.2f} с ({total / elapsed:,.0f} строк/с)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
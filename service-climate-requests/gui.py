@@ -8,10 +8,21 @@ from io import BytesIO
 from datetime import datetime, timedelta
 import time
 import json
+import logging
 
 # Настройки
 API_BASE_URL = "http://localhost:8000"
 QR_CODE_URL = "https://docs.google.com/forms/d/e/1FAIpQLSepjRWo5ZL2OC0fn6hyMQIQZGCPr0C8CznVOhlOtcE7BlLTYQ/viewform?usp=dialog"
+REQUESTS_PAGE_SIZE = 100
+API_CACHE_TTL_SECONDS = 30
+HTTP_POOL_SIZE = 10
+REQUEST_STATUSES = ["Новая заявка", "В процессе ремонта", "Ожидание комплектующих", "Готова к выдаче", "Завершена"]
+
+logger = logging.getLogger("gui")
+if not logger.handlers:
+    # Скрипт выполняется заново при каждом перезапуске - обработчик добавляем один раз
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
 
 # Инициализация состояния сессии
 def init_session_state():
@@ -23,17 +34,58 @@ def init_session_state():
         st.session_state.page = "main"
     if 'current_request_id' not in st.session_state:
         st.session_state.current_request_id = None
+    if 'requests_cursors' not in st.session_state:
+        st.session_state.requests_cursors = [None]
+    if 'requests_filters_key' not in st.session_state:
+        st.session_state.requests_filters_key = None
+
+# HTTP-сессия и кэш GET-ответов (свои для каждой сессии Streamlit)
+def get_http_session():
+    """Сессия requests с пулом keep-alive соединений к API"""
+    if "http_session" not in st.session_state:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        st.session_state.http_session = session
+    return st.session_state.http_session
+
+def get_api_cache():
+    """Кэш GET-ответов текущего пользователя: ключ -> (время загрузки, ответ)"""
+    if "api_cache" not in st.session_state:
+        st.session_state.api_cache = {}
+        st.session_state.api_cache_stats = {"hits": 0, "revalidated": 0, "misses": 0}
+    return st.session_state.api_cache
+
+def clear_api_cache():
+    """Сбросить кэш GET-ответов (после изменения данных и при выходе)"""
+    get_api_cache().clear()
+
+def log_api_cache_stats():
+    """Записать в лог попадания в кэш за текущий перезапуск скрипта и обнулить счетчики"""
+    get_api_cache()
+    stats = st.session_state.api_cache_stats
+    total = sum(stats.values())
+    if total:
+        logger.info(
+            "API cache: %d запросов, попаданий %d, подтверждено 304 %d, промахов %d (hit rate %.0f%%)",
+            total, stats["hits"], stats["revalidated"], stats["misses"],
+            100 * (stats["hits"] + stats["revalidated"]) / total
+        )
+    for key in stats:
+        stats[key] = 0
 
 # API функции
 def api_login(login: str, password: str):
     """Авторизация в API"""
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_BASE_URL}/token",
             data={"username": login, "password": password},
             headers={"Content-Type": "application/x-www-form-urlencoded"}
         )
         if response.status_code == 200:
+            clear_api_cache()
             return response.json()
         else:
             return None
@@ -43,7 +95,7 @@ def api_login(login: str, password: str):
 def api_register(user_data):
     """Регистрация пользователя"""
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_BASE_URL}/register",
             json=user_data
         )
@@ -52,18 +104,38 @@ def api_register(user_data):
         return None
 
 def api_get(endpoint, params=None):
-    """GET запрос к API"""
+    """GET запрос к API (успешные ответы кэшируются на API_CACHE_TTL_SECONDS).
+
+    Устаревший ответ перепроверяется по ETag: при 304 используется
+    закэшированный ответ без повторной загрузки данных.
+    """
     if st.session_state.access_token:
         headers = {"Authorization": f"Bearer {st.session_state.access_token}"}
+        cache = get_api_cache()
+        stats = st.session_state.api_cache_stats
+        key = (endpoint, json.dumps(params, sort_keys=True, ensure_ascii=False, default=str))
+        cached = cache.get(key)
+        if cached and time.time() - cached[0] < API_CACHE_TTL_SECONDS:
+            stats["hits"] += 1
+            return cached[1]
+        if cached and cached[1].headers.get("ETag"):
+            headers["If-None-Match"] = cached[1].headers["ETag"]
         try:
-            response = requests.get(
+            response = get_http_session().get(
                 f"{API_BASE_URL}{endpoint}",
                 headers=headers,
                 params=params
             )
-            return response
         except:
             return None
+        if response.status_code == 304 and cached:
+            stats["revalidated"] += 1
+            cache[key] = (time.time(), cached[1])
+            return cached[1]
+        stats["misses"] += 1
+        if response.status_code == 200:
+            cache[key] = (time.time(), response)
+        return response
     return None
 
 def api_post(endpoint, data):
@@ -74,11 +146,13 @@ def api_post(endpoint, data):
             "Content-Type": "application/json"
         }
         try:
-            response = requests.post(
+            response = get_http_session().post(
                 f"{API_BASE_URL}{endpoint}",
                 headers=headers,
                 json=data
             )
+            if response.ok:
+                clear_api_cache()
             return response
         except:
             return None
@@ -92,11 +166,13 @@ def api_put(endpoint, data):
             "Content-Type": "application/json"
         }
         try:
-            response = requests.put(
+            response = get_http_session().put(
                 f"{API_BASE_URL}{endpoint}",
                 headers=headers,
                 json=data
             )
+            if response.ok:
+                clear_api_cache()
             return response
         except:
             return None
@@ -107,15 +183,72 @@ def api_delete(endpoint):
     if st.session_state.access_token:
         headers = {"Authorization": f"Bearer {st.session_state.access_token}"}
         try:
-            response = requests.delete(
+            response = get_http_session().delete(
                 f"{API_BASE_URL}{endpoint}",
                 headers=headers
             )
+            if response.ok:
+                clear_api_cache()
             return response
         except:
             return None
     return None
 
+def fetch_requests_page(params=None):
+    """Одна страница заявок: (заявки, курсор следующей страницы)"""
+    # Табличный формат: имена колонок передаются один раз на страницу
+    response = api_get("/requests", params=dict(params or {}, format="columns"))
+    if response and response.status_code == 200:
+        payload = response.json()
+        columns = payload["columns"]
+        return [dict(zip(columns, row)) for row in payload["rows"]], response.headers.get("X-Next-Cursor")
+    return None, None
+
+def fetch_picker_page(key):
+    """Страница заявок для списка выбора с кнопками навигации по курсору.
+
+    Стек курсоров хранится в st.session_state[key], как requests_cursors
+    на странице заявок.
+    """
+    if key not in st.session_state:
+        st.session_state[key] = [None]
+    cursors = st.session_state[key]
+    params = {"limit": REQUESTS_PAGE_SIZE}
+    if cursors[-1]:
+        params["cursor"] = cursors[-1]
+    requests_data, next_cursor = fetch_requests_page(params)
+    if requests_data is not None:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if len(cursors) > 1:
+                if st.button("← Предыдущие", key=f"{key}_prev"):
+                    cursors.pop()
+                    st.rerun()
+        with col2:
+            st.caption(f"Страница {len(cursors)}")
+        with col3:
+            if next_cursor:
+                if st.button("Следующие →", key=f"{key}_next"):
+                    cursors.append(next_cursor)
+                    st.rerun()
+    return requests_data
+
+def fetch_comments_batch(request_ids):
+    """Комментарии к нескольким заявкам одним запросом: {ID заявки: [комментарии]}"""
+    if not request_ids:
+        return {}
+    response = api_get("/comments", params={"request_ids": list(request_ids)})
+    if response and response.status_code == 200:
+        return {int(request_id): comments for request_id, comments in response.json().items()}
+    return None
+
+def fetch_search_page(params):
+    """Одна страница результатов поиска: (заявки, смещение следующей страницы)"""
+    response = api_get("/search", params=params)
+    if response and response.status_code == 200:
+        return response.json(), response.headers.get("X-Next-Offset")
+    return None, None
+
 # Вспомогательные функции
 def generate_qr_code(url):
     """Генерация QR кода"""
@@ -275,30 +408,22 @@ def main_page():
     st.header("📊 Общая информация")
     
     if st.session_state.user_info["role"] in ["Менеджер", "Оператор"]:
-        response = api_get("/requests")
+        # Только количество по статусам: ответ не зависит от числа заявок
+        response = api_get("/stats/status")
         if response and response.status_code == 200:
-            requests_data = response.json()
-            
+            status_summary = response.json()
+            status_counts = status_summary["status_counts"]
             col1, col2, col3 = st.columns(3)
             
-            # Статистика по статусам
-            status_counts = {}
-            for req in requests_data:
-                status = req.get("request_status", "Не указан")
-                status_counts[status] = status_counts.get(status, 0) + 1
-            
             with col1:
-                st.metric("Всего заявок", len(requests_data))
+                st.metric("Всего заявок", status_summary["total"])
             
             with col2:
-                completed = sum(1 for req in requests_data 
-                              if req.get("request_status") in ["Готова к выдаче", "Завершена"])
+                completed = sum(status_counts.get(status, 0) for status in ["Готова к выдаче", "Завершена"])
                 st.metric("Выполнено", completed)
             
             with col3:
-                in_progress = sum(1 for req in requests_data 
-                                 if req.get("request_status") == "В процессе ремонта")
-                st.metric("В работе", in_progress)
+                st.metric("В работе", status_counts.get("В процессе ремонта", 0))
             
             # График распределения заявок
             if status_counts:
@@ -330,102 +455,142 @@ def requests_page():
     with tab1:
         st.header("Текущие заявки")
         
-        response = api_get("/requests")
-        if response and response.status_code == 200:
-            requests_data = response.json()
-            
+        # Фильтры применяются на сервере
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            status_filter = st.multiselect(
+                "Фильтр по статусу",
+                options=REQUEST_STATUSES,
+                default=[]
+            )
+            tech_type_filter = st.text_input("Тип оборудования")
+        with col2:
+            use_date_filter = st.checkbox("Фильтр по дате заявки")
+            if use_date_filter:
+                date_from = st.date_input("С", datetime.now() - timedelta(days=30))
+                date_to = st.date_input("По", datetime.now())
+        with col3:
+            master_filter = 0
+            client_filter = 0
+            if st.session_state.user_info["role"] in ["Менеджер", "Оператор"]:
+                master_filter = st.number_input("ID специалиста", min_value=0, step=1, help="0 - все специалисты")
+            if st.session_state.user_info["role"] != "Заказчик":
+                client_filter = st.number_input("ID клиента", min_value=0, step=1, help="0 - все клиенты")
+        
+        params = {"limit": REQUESTS_PAGE_SIZE}
+        if status_filter:
+            params["status"] = status_filter
+        if tech_type_filter:
+            params["climate_tech_type"] = tech_type_filter
+        if use_date_filter:
+            params["date_from"] = str(date_from)
+            params["date_to"] = str(date_to)
+        if master_filter:
+            params["master_id"] = int(master_filter)
+        if client_filter:
+            params["client_id"] = int(client_filter)
+        
+        # Полнотекстовый поиск выполняется на сервере, с теми же фильтрами
+        search = st.text_input("🔍 Поиск по описанию проблемы, модели и комментариям")
+        if search.strip():
+            params["q"] = search.strip()
+        
+        # При смене фильтров начинаем с первой страницы
+        filters_key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        if st.session_state.requests_filters_key != filters_key:
+            st.session_state.requests_filters_key = filters_key
+            st.session_state.requests_cursors = [None]
+        page_cursor = st.session_state.requests_cursors[-1]
+        
+        if "q" in params:
+            # Результаты поиска упорядочены по релевантности, страницы - по смещению
+            if page_cursor:
+                params["offset"] = page_cursor
+            requests_data, next_cursor = fetch_search_page(params)
+        else:
+            if page_cursor:
+                params["cursor"] = page_cursor
+            requests_data, next_cursor = fetch_requests_page(params)
+        if requests_data is not None:
             if requests_data:
-                # Фильтрация по роли
-                if st.session_state.user_info["role"] == "Заказчик":
-                    requests_data = [req for req in requests_data 
-                                    if req.get("client_id") == st.session_state.user_info["user_id"]]
-                elif st.session_state.user_info["role"] == "Специалист":
-                    requests_data = [req for req in requests_data 
-                                    if req.get("master_id") == st.session_state.user_info["user_id"]]
+                # Комментарии ко всей странице - одним запросом
+                page_comments = fetch_comments_batch([req["request_id"] for req in requests_data]) or {}
                 
-                if requests_data:
-                    # Создаем DataFrame
-                    df_data = []
-                    for req in requests_data:
-                        df_data.append({
-                            "ID": req["request_id"],
-                            "Дата": req["start_date"],
-                            "Оборудование": req["climate_tech_type"],
-                            "Модель": req["climate_tech_model"],
-                            "Проблема": req["problem_description"],
-                            "Статус": f"{get_status_color(req['request_status'])} {req['request_status']}",
-                            "Мастер": f"ID: {req.get('master_id', 'Не назначен')}",
-                            "Клиент": f"ID: {req.get('client_id')}"
-                        })
-                    
-                    df = pd.DataFrame(df_data)
-                    
-                    # Поиск и фильтры
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        search = st.text_input("🔍 Поиск по оборудованию или проблеме")
-                    with col2:
-                        status_filter = st.multiselect(
-                            "Фильтр по статусу",
-                            options=["Новая заявка", "В процессе ремонта", "Ожидание комплектующих", 
-                                    "Готова к выдаче", "Завершена"],
-                            default=[]
-                        )
-                    
-                    if search:
-                        df = df[df.apply(lambda row: search.lower() in str(row["Оборудование"]).lower() or 
-                                                    search.lower() in str(row["Проблема"]).lower(), axis=1)]
-                    
-                    if status_filter:
-                        status_symbols = [get_status_color(s) for s in status_filter]
-                        df = df[df["Статус"].str.contains('|'.join(status_symbols))]
-                    
-                    st.dataframe(df, use_container_width=True, hide_index=True)
-                    
-                    # Детальный просмотр заявки
-                    st.subheader("🔍 Детали заявки")
-                    selected_id = st.selectbox(
-                        "Выберите ID заявки для подробного просмотра",
-                        options=df["ID"].tolist(),
-                        key="request_detail_select"
-                    )
+                # Создаем DataFrame
+                df_data = []
+                for req in requests_data:
+                    df_data.append({
+                        "ID": req["request_id"],
+                        "Дата": req["start_date"],
+                        "Оборудование": req["climate_tech_type"],
+                        "Модель": req["climate_tech_model"],
+                        "Проблема": req["problem_description"],
+                        "Статус": f"{get_status_color(req['request_status'])} {req['request_status']}",
+                        "Мастер": f"ID: {req.get('master_id', 'Не назначен')}",
+                        "Клиент": f"ID: {req.get('client_id')}",
+                        "Комментарии": len(page_comments.get(req["request_id"], []))
+                    })
+                
+                df = pd.DataFrame(df_data)
+                
+                st.dataframe(df, use_container_width=True, hide_index=True)
+                
+                # Навигация по страницам
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col1:
+                    if len(st.session_state.requests_cursors) > 1:
+                        if st.button("← Предыдущая страница"):
+                            st.session_state.requests_cursors.pop()
+                            st.rerun()
+                with col2:
+                    st.caption(f"Страница {len(st.session_state.requests_cursors)}")
+                with col3:
+                    if next_cursor:
+                        if st.button("Следующая страница →"):
+                            st.session_state.requests_cursors.append(next_cursor)
+                            st.rerun()
+                
+                # Детальный просмотр заявки
+                st.subheader("🔍 Детали заявки")
+                selected_id = st.selectbox(
+                    "Выберите ID заявки для подробного просмотра",
+                    options=df["ID"].tolist(),
+                    key="request_detail_select"
+                )
                     
-                    if selected_id:
-                        detail_response = api_get(f"/requests/{selected_id}")
-                        if detail_response and detail_response.status_code == 200:
-                            request_detail = detail_response.json()
+                if selected_id:
+                    detail_response = api_get(f"/requests/{selected_id}")
+                    if detail_response and detail_response.status_code == 200:
+                        request_detail = detail_response.json()
                             
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.write(f"**Дата создания:** {request_detail['start_date']}")
-                                st.write(f"**Тип оборудования:** {request_detail['climate_tech_type']}")
-                                st.write(f"**Модель:** {request_detail['climate_tech_model']}")
-                                if request_detail.get('completion_date'):
-                                    st.write(f"**Дата завершения:** {request_detail['completion_date']}")
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.write(f"**Дата создания:** {request_detail['start_date']}")
+                            st.write(f"**Тип оборудования:** {request_detail['climate_tech_type']}")
+                            st.write(f"**Модель:** {request_detail['climate_tech_model']}")
+                            if request_detail.get('completion_date'):
+                                st.write(f"**Дата завершения:** {request_detail['completion_date']}")
                             
-                            with col2:
-                                st.write(f"**Статус:** {request_detail['request_status']}")
-                                st.write(f"**Клиент ID:** {request_detail['client_id']}")
-                                if request_detail.get('master_id'):
-                                    st.write(f"**Мастер ID:** {request_detail['master_id']}")
-                                if request_detail.get('repair_parts'):
-                                    st.write(f"**Запчасти:** {request_detail['repair_parts']}")
+                        with col2:
+                            st.write(f"**Статус:** {request_detail['request_status']}")
+                            st.write(f"**Клиент ID:** {request_detail['client_id']}")
+                            if request_detail.get('master_id'):
+                                st.write(f"**Мастер ID:** {request_detail['master_id']}")
+                            if request_detail.get('repair_parts'):
+                                st.write(f"**Запчасти:** {request_detail['repair_parts']}")
                             
-                            st.write(f"**Описание проблемы:**")
-                            st.info(request_detail['problem_description'])
+                        st.write(f"**Описание проблемы:**")
+                        st.info(request_detail['problem_description'])
                             
-                            # Комментарии
-                            comments_response = api_get(f"/requests/{selected_id}/comments")
-                            if comments_response and comments_response.status_code == 200:
-                                comments = comments_response.json()
-                                if comments:
-                                    st.subheader("💬 Комментарии")
-                                    for comment in comments:
-                                        with st.expander(f"Комментарий от {comment.get('master_name', 'ID:' + str(comment['master_id']))} "
-                                                        f"({comment['created_at']})"):
-                                            st.write(comment['message'])
-                else:
-                    st.info("Заявок не найдено")
+                        # Комментарии (уже загружены для всей страницы)
+                        comments = page_comments.get(selected_id)
+                        if comments is not None:
+                            if comments:
+                                st.subheader("💬 Комментарии")
+                                for comment in comments:
+                                    with st.expander(f"Комментарий от {comment.get('master_name', 'ID:' + str(comment['master_id']))} "
+                                                    f"({comment['created_at']})"):
+                                        st.write(comment['message'])
             else:
                 st.info("Заявок не найдено")
         else:
@@ -515,16 +680,9 @@ def requests_page():
         with tab3:
             st.header("Изменить заявку")
             
-            # Получаем список заявок для выбора
-            response = api_get("/requests")
-            if response and response.status_code == 200:
-                requests_list = response.json()
-                
-                # Фильтрация по роли
-                if st.session_state.user_info["role"] == "Специалист":
-                    requests_list = [req for req in requests_list 
-                                    if req.get("master_id") == st.session_state.user_info["user_id"]]
-                
+            # Заявки для выбора - постранично (сервер учитывает роль)
+            requests_list = fetch_picker_page("edit_requests_cursors")
+            if requests_list is not None:
                 if requests_list:
                     request_options = {}
                     for req in requests_list:
@@ -622,10 +780,8 @@ def requests_page():
             st.header("Удалить заявку")
             st.warning("⚠️ Это действие нельзя отменить!")
             
-            response = api_get("/requests")
-            if response and response.status_code == 200:
-                requests_list = response.json()
-                
+            requests_list = fetch_picker_page("delete_requests_cursors")
+            if requests_list is not None:
                 if requests_list:
                     request_options = {}
                     for req in requests_list:
@@ -749,22 +905,19 @@ def comments_page():
     
     st.title("💬 Комментарии")
     
-    # Получаем все заявки пользователя
-    response = api_get("/requests")
-    if response and response.status_code == 200:
-        requests_data = response.json()
-        
-        # Фильтрация по роли
-        if st.session_state.user_info["role"] == "Специалист":
-            requests_data = [req for req in requests_data 
-                            if req.get("master_id") == st.session_state.user_info["user_id"]]
-        
+    # Заявки пользователя - постранично (сервер учитывает роль)
+    requests_data = fetch_picker_page("comments_requests_cursors")
+    if requests_data is not None:
         if requests_data:
+            # Комментарии ко всем заявкам страницы - одним запросом
+            page_comments = fetch_comments_batch([req["request_id"] for req in requests_data])
+            
             # Выбор заявки
             request_options = {}
             for req in requests_data:
+                comments_count = len((page_comments or {}).get(req["request_id"], []))
                 request_options[req["request_id"]] = \
-                    f"ID: {req['request_id']} - {req['climate_tech_type']} ({req['request_status']})"
+                    f"ID: {req['request_id']} - {req['climate_tech_type']} ({req['request_status']}) 💬 {comments_count}"
             
             selected_request_id = st.selectbox(
                 "Выберите заявку для просмотра комментариев",
@@ -773,10 +926,9 @@ def comments_page():
             )
             
             if selected_request_id:
-                # Получаем комментарии
-                comments_response = api_get(f"/requests/{selected_request_id}/comments")
-                if comments_response and comments_response.status_code == 200:
-                    comments = comments_response.json()
+                # Комментарии выбранной заявки
+                if page_comments is not None:
+                    comments = page_comments.get(selected_request_id, [])
                     
                     if comments:
                         st.subheader(f"Комментарии к заявке ID: {selected_request_id}")
@@ -824,6 +976,56 @@ def comments_page():
         st.session_state.page = "main"
         st.rerun()
 
+def render_user_statistics(user_stats: dict):
+    """Метрики и графики по статистике пользователя из /stats/users/{id}"""
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Всего заявок", user_stats["total"])
+    
+    with col2:
+        st.metric("Выполнено", user_stats["completed"])
+    
+    with col3:
+        st.metric("Эффективность", f"{user_stats['efficiency'] or 0:.1f}%")
+    
+    if user_stats["average_completion_days"] is not None:
+        st.metric("Среднее время выполнения (дней)", f"{user_stats['average_completion_days']:.1f}")
+    
+    # График распределения по статусам
+    status_counts = user_stats["status_counts"]
+    if status_counts:
+        fig = go.Figure(data=[go.Pie(
+            labels=list(status_counts.keys()),
+            values=list(status_counts.values()),
+            hole=.3,
+            title="Распределение заявок по статусам"
+        )])
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Распределение времени выполнения (дней -> количество заявок)
+    completion_days_counts = user_stats["completion_days_counts"]
+    if completion_days_counts:
+        days = sorted(completion_days_counts, key=int)
+        fig = px.bar(
+            x=[int(d) for d in days],
+            y=[completion_days_counts[d] for d in days],
+            title="Распределение времени выполнения заявок",
+            labels={"x": "Дней на выполнение", "y": "Количество заявок"}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # График по типам оборудования
+    tech_type_counts = user_stats["tech_type_counts"]
+    if tech_type_counts:
+        fig = px.bar(
+            x=list(tech_type_counts.keys()),
+            y=list(tech_type_counts.values()),
+            title="Распределение заявок по типам оборудования",
+            labels={"x": "Тип оборудования", "y": "Количество"}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
 def statistics_page():
     """Страница статистики"""
     st.title("📊 Статистика")
@@ -855,11 +1057,10 @@ def statistics_page():
                         st.metric("Среднее время (дней)", "Нет данных")
                 
                 with col3:
-                    # Получаем общее количество заявок
-                    requests_response = api_get("/requests")
-                    if requests_response and requests_response.status_code == 200:
-                        total_requests = len(requests_response.json())
-                        st.metric("Всего заявок", total_requests)
+                    # Общее количество заявок - из счетчиков по статусам
+                    status_response = api_get("/stats/status")
+                    if status_response and status_response.status_code == 200:
+                        st.metric("Всего заявок", status_response.json()["total"])
                 
                 # Статистика по проблемам
                 if stats["problem_statistics"]:
@@ -934,131 +1135,44 @@ def statistics_page():
                 )
                 
                 if selected_user_id:
-                    # Получаем заявки пользователя
-                    requests_response = api_get("/requests")
-                    if requests_response and requests_response.status_code == 200:
-                        all_requests = requests_response.json()
-                        
-                        # Фильтруем заявки по роли пользователя
-                        selected_user = next((u for u in users if u["user_id"] == selected_user_id), None)
-                        if selected_user:
-                            user_requests = []
-                            if selected_user["role"] == "Заказчик":
-                                user_requests = [r for r in all_requests if r.get("client_id") == selected_user_id]
-                            elif selected_user["role"] == "Специалист":
-                                user_requests = [r for r in all_requests if r.get("master_id") == selected_user_id]
-                            elif selected_user["role"] == "Оператор":
-                                # Операторы работают со всеми заявками
-                                user_requests = all_requests
+                    # Статистика считается на сервере одним запросом
+                    stats_response = api_get(f"/stats/users/{selected_user_id}")
+                    if stats_response and stats_response.status_code == 200:
+                        user_stats = stats_response.json()
+                        if user_stats["total"]:
+                            st.subheader(f"Статистика для {user_stats['fio']}")
+                            render_user_statistics(user_stats)
+                        else:
+                            st.info("У пользователя нет заявок")
+                    else:
+                        st.error("Ошибка при загрузке статистики пользователя")
+
+            # Сводка по всем специалистам
+            specialists_response = api_get("/stats/specialists")
+            if specialists_response and specialists_response.status_code == 200:
+                specialists = specialists_response.json()
+                if specialists:
+                    st.subheader("Специалисты")
+                    specialists_df = pd.DataFrame([{
+                        "ФИО": s["fio"],
+                        "Всего заявок": s["total"],
+                        "Выполнено": s["completed"],
+                        "Эффективность, %": s["efficiency"],
+                        "Среднее время (дней)": round(s["average_completion_days"], 1)
+                            if s["average_completion_days"] is not None else None,
+                    } for s in specialists])
+                    st.dataframe(specialists_df, use_container_width=True, hide_index=True)
                             
-                            if user_requests:
-                                st.subheader(f"Статистика для {selected_user['fio']}")
-                                
-                                col1, col2, col3 = st.columns(3)
-                                
-                                with col1:
-                                    total = len(user_requests)
-                                    st.metric("Всего заявок", total)
-                                
-                                with col2:
-                                    completed = sum(1 for r in user_requests 
-                                                   if r.get("request_status") in ["Готова к выдаче", "Завершена"])
-                                    st.metric("Выполнено", completed)
-                                
-                                with col3:
-                                    if completed > 0 and total > 0:
-                                        efficiency = (completed / total) * 100
-                                        st.metric("Эффективность", f"{efficiency:.1f}%")
-                                    else:
-                                        st.metric("Эффективность", "0%")
-                                
-                                # График распределения по статусам
-                                status_counts = {}
-                                for req in user_requests:
-                                    status = req.get("request_status", "Не указан")
-                                    status_counts[status] = status_counts.get(status, 0) + 1
-                                
-                                if status_counts:
-                                    fig = go.Figure(data=[go.Pie(
-                                        labels=list(status_counts.keys()),
-                                        values=list(status_counts.values()),
-                                        hole=.3,
-                                        title="Распределение заявок по статусам"
-                                    )])
-                                    st.plotly_chart(fig, use_container_width=True)
-                            else:
-                                st.info("У пользователя нет заявок")
-                                
     elif user_role == "Специалист":
         # Для специалиста - его личная статистика
         st.header("Ваша статистика")
         
-        # Получаем заявки специалиста
-        requests_response = api_get("/requests")
-        if requests_response and requests_response.status_code == 200:
-            all_requests = requests_response.json()
-            specialist_requests = [r for r in all_requests 
-                                  if r.get("master_id") == st.session_state.user_info["user_id"]]
-            
-            if specialist_requests:
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    total = len(specialist_requests)
-                    st.metric("Всего заявок", total)
-                
-                with col2:
-                    completed = sum(1 for r in specialist_requests 
-                                   if r.get("request_status") in ["Готова к выдаче", "Завершена"])
-                    st.metric("Выполнено", completed)
-                
-                with col3:
-                    if completed > 0 and total > 0:
-                        efficiency = (completed / total) * 100
-                        st.metric("Эффективность", f"{efficiency:.1f}%")
-                    else:
-                        st.metric("Эффективность", "0%")
-                
-                # Время выполнения заявок
-                completion_times = []
-                for req in specialist_requests:
-                    if req.get("completion_date") and req.get("start_date"):
-                        try:
-                            start = datetime.strptime(req["start_date"], "%Y-%m-%d")
-                            end = datetime.strptime(req["completion_date"], "%Y-%m-%d")
-                            days = (end - start).days
-                            if days >= 0:
-                                completion_times.append(days)
-                        except:
-                            pass
-                
-                if completion_times:
-                    avg_time = sum(completion_times) / len(completion_times)
-                    st.metric("Среднее время выполнения (дней)", f"{avg_time:.1f}")
-                    
-                    # Гистограмма времени выполнения
-                    fig = px.histogram(
-                        x=completion_times,
-                        nbins=10,
-                        title="Распределение времени выполнения заявок",
-                        labels={"x": "Дней на выполнение", "y": "Количество заявок"}
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                # График по типам оборудования
-                equipment_counts = {}
-                for req in specialist_requests:
-                    equipment = req.get("climate_tech_type", "Не указано")
-                    equipment_counts[equipment] = equipment_counts.get(equipment, 0) + 1
-                
-                if equipment_counts:
-                    fig = px.bar(
-                        x=list(equipment_counts.keys()),
-                        y=list(equipment_counts.values()),
-                        title="Распределение заявок по типам оборудования",
-                        labels={"x": "Тип оборудования", "y": "Количество"}
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+        # Статистика по назначенным заявкам считается на сервере
+        stats_response = api_get(f"/stats/users/{st.session_state.user_info['user_id']}")
+        if stats_response and stats_response.status_code == 200:
+            user_stats = stats_response.json()
+            if user_stats["total"]:
+                render_user_statistics(user_stats)
             else:
                 st.info("У вас пока нет заявок")
         else:
@@ -1083,6 +1197,14 @@ def main():
     # Инициализация состояния
     init_session_state()
     
+    try:
+        render_app()
+    finally:
+        # st.rerun() прерывает скрипт исключением - статистику пишем в любом случае
+        log_api_cache_stats()
+
+def render_app():
+    """Страница приложения в зависимости от авторизации и выбранного раздела"""
     # Проверка авторизации
     if not st.session_state.access_token:
         # Страница выбора: вход или регистрация
@@ -1126,6 +1248,7 @@ def main():
             
             # Выход
             if st.button("🚪 Выйти", use_container_width=True):
+                clear_api_cache()
                 st.session_state.access_token = None
                 st.session_state.user_info = None
                 st.session_state.page = "main"
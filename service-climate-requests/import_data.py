@@ -0,0 +1,299 @@
+# import_data.py
+"""Импорт пользователей, заявок и комментариев из CSV (inputData*.csv).
+
+Файлы читаются потоково, строки вставляются пачками через executemany
+в больших транзакциях. Индексы и триггеры на время загрузки удаляются
+и создаются заново в конце (вместе со счетчиками статистики и
+полнотекстовыми индексами), внешние ключи проверяются один раз после
+загрузки.
+
+    python import_data.py
+    python import_data.py --db big.db --users u.csv --requests r.csv --comments c.csv
+"""
+import argparse
+import csv
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+import database
+import problem_categories
+
+BATCH_SIZE = 50_000
+COMMIT_EVERY = 500_000
+MAX_REPORTED_REJECTS = 10
+
+# Колонки CSV -> колонки schema.sql
+USERS_COLUMNS = {
+    "userID": "user_id",
+    "fio": "fio",
+    "phone": "phone",
+    "login": "login",
+    "password": "password",
+    "type": "role",
+}
+
+REQUESTS_COLUMNS = {
+    "requestID": "request_id",
+    "startDate": "start_date",
+    "climateTechType": "climate_tech_type",
+    "climateTechModel": "climate_tech_model",
+    "problemDescryption": "problem_description",
+    "requestStatus": "request_status",
+    "completionDate": "completion_date",
+    "repairParts": "repair_parts",
+    "masterID": "master_id",
+    "clientID": "client_id",
+}
+
+COMMENTS_COLUMNS = {
+    "commentID": "comment_id",
+    "message": "message",
+    "masterID": "master_id",
+    "requestID": "request_id",
+    "createdAt": "created_at",
+}
+
+INTEGER_COLUMNS = {"user_id", "request_id", "comment_id", "master_id", "client_id"}
+
+REQUIRED_COLUMNS = {
+    "users": {"fio", "login", "password", "role"},
+    "requests": {"start_date", "climate_tech_type", "request_status", "client_id"},
+    "comments": {"message", "request_id"},
+}
+
+IMPORT_ORDER = (
+    ("users", USERS_COLUMNS),
+    ("requests", REQUESTS_COLUMNS),
+    ("comments", COMMENTS_COLUMNS),
+)
+
+
+class ImportStats:
+    """Счетчики импорта одного файла"""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.reject_samples = []
+        self.seconds = 0.0
+
+    def reject(self, line_no, reason: str):
+        self.rejected += 1
+        if len(self.reject_samples) < MAX_REPORTED_REJECTS:
+            self.reject_samples.append((line_no, reason))
+
+    def reject_many(self, count: int, reason: str):
+        self.rejected += count
+        if count and len(self.reject_samples) < MAX_REPORTED_REJECTS:
+            self.reject_samples.append(("-", f"{reason} ({count})"))
+
+    def report(self) -> str:
+        rate = self.read / self.seconds if self.seconds else 0
+        return (f"{self.table}: прочитано {self.read}, загружено {self.inserted}, "
+                f"отклонено {self.rejected} за {self.seconds:.2f} с ({rate:,.0f} строк/с)")
+
+
+def convert_value(column: str, value: str):
+    """Значение из CSV -> значение для БД ('null' -> NULL, ID -> int)"""
+    if value is None or value.strip().lower() == "null":
+        return None
+    if column in INTEGER_COLUMNS:
+        return int(value) if value.strip() else None
+    return value
+
+
+def read_rows(path: str, table: str, mapping: dict, stats: ImportStats):
+    """Потоково читать CSV и выдавать кортежи значений в порядке колонок БД"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [h.strip() for h in header]
+        unknown = [h for h in header if h not in mapping]
+        if unknown:
+            raise ValueError(f"{path}: неизвестные колонки {unknown}")
+        columns = [mapping[h] for h in header]
+        missing = REQUIRED_COLUMNS[table] - set(columns)
+        if missing:
+            raise ValueError(f"{path}: нет обязательных колонок {sorted(missing)}")
+        yield columns
+
+        required_idx = [i for i, c in enumerate(columns) if c in REQUIRED_COLUMNS[table]]
+        for line_no, record in enumerate(reader, start=2):
+            if not record:
+                continue
+            stats.read += 1
+            if len(record) != len(columns):
+                stats.reject(line_no, f"ожидалось {len(columns)} колонок, получено {len(record)}")
+                continue
+            try:
+                values = tuple(convert_value(c, v) for c, v in zip(columns, record))
+            except ValueError as e:
+                stats.reject(line_no, f"некорректное число: {e}")
+                continue
+            if any(values[i] is None or values[i] == "" for i in required_idx):
+                stats.reject(line_no, "пустое обязательное поле")
+                continue
+            yield values
+
+
+def drop_deferred_objects(conn: sqlite3.Connection):
+    """Удалить индексы и триггеры загружаемых таблиц на время загрузки.
+
+    В конце импорта их заново создает database.init_db() по schema.sql.
+    """
+    rows = conn.execute("""
+        SELECT type, name FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+          AND tbl_name IN ('users', 'requests', 'comments')
+    """).fetchall()
+    for object_type, name in rows:
+        conn.execute(f'DROP {object_type.upper()} IF EXISTS "{name}"')
+    # Счетчики статистики без триггеров устареют - init_db заполнит их заново
+    conn.execute("DELETE FROM stats_status_counts")
+    conn.execute("DELETE FROM stats_category_counts")
+    conn.execute("DELETE FROM stats_completion")
+    conn.execute("DELETE FROM stats_master_status_counts")
+    # Полнотекстовые индексы тоже строятся заново в init_db
+    conn.execute("INSERT INTO requests_fts (requests_fts) VALUES ('delete-all')")
+    conn.execute("INSERT INTO comments_fts (comments_fts) VALUES ('delete-all')")
+
+
+def abort_load(conn: sqlite3.Connection, db_path: str):
+    """Прервать загрузку: откатить транзакцию и вернуть индексы, триггеры и счетчики.
+
+    Без этого после ошибки БД осталась бы без триггеров, и последующие
+    изменения заявок не попадали бы в счетчики статистики.
+    """
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+    conn.close()
+    # init_db пересчитывает счетчики по уже зафиксированным строкам
+    database.init_db(db_path)
+
+
+def remove_orphans(conn: sqlite3.Connection, table: str, stats: ImportStats):
+    """Удалить строки с нарушенными внешними ключами (считаются отклоненными)"""
+    parents = {}
+    for _, rowid, parent, _ in conn.execute(f"PRAGMA foreign_key_check({table})"):
+        parents.setdefault(rowid, parent)
+    for rowid, parent in sorted(parents.items()):
+        stats.reject(f"id={rowid}", f"нет связанной записи в {parent}")
+    conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", [(r,) for r in parents])
+    stats.inserted -= len(parents)
+
+
+def import_file(conn: sqlite3.Connection, path: str, table: str, mapping: dict) -> ImportStats:
+    """Загрузить один CSV-файл в таблицу"""
+    stats = ImportStats(table)
+    started = time.perf_counter()
+    rows = read_rows(path, table, mapping, stats)
+    columns = next(rows, None)
+    if columns is None:
+        return stats
+
+    sql = (f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+           f"VALUES ({', '.join('?' * len(columns))})")
+    uncommitted = 0
+    conn.execute("BEGIN")
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+        before = conn.total_changes
+        conn.executemany(sql, batch)
+        inserted = conn.total_changes - before
+        stats.inserted += inserted
+        # INSERT OR IGNORE пропускает дубликаты ключей и логинов
+        stats.reject_many(len(batch) - inserted, "дубликат ключа")
+        uncommitted += len(batch)
+        if uncommitted >= COMMIT_EVERY:
+            conn.execute("COMMIT")
+            conn.execute("BEGIN")
+            uncommitted = 0
+    conn.execute("COMMIT")
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def run_import(db_path: str, files: dict) -> list:
+    """Импортировать файлы {таблица: путь} в БД, вернуть статистику"""
+    database.init_db(db_path)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute(f"PRAGMA cache_size = -{database.CACHE_SIZE_KB * 4}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+    all_stats = []
+    try:
+        drop_deferred_objects(conn)
+        for table, mapping in IMPORT_ORDER:
+            if files.get(table):
+                stats = import_file(conn, files[table], table, mapping)
+                print(stats.report())
+                all_stats.append(stats)
+
+        started = time.perf_counter()
+        conn.execute("BEGIN")
+        for stats in all_stats:
+            if stats.table != "users":
+                remove_orphans(conn, stats.table, stats)
+        # Категории неисправностей - до пересчета счетчиков в init_db
+        problem_categories.backfill_categories(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        abort_load(conn, db_path)
+        raise
+    finally:
+        conn.close()
+
+    # Индексы, триггеры и счетчики статистики - по schema.sql
+    database.init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    print(f"Проверка ключей, категории, индексы и статистика: {time.perf_counter() - started:.2f} с")
+    return all_stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт данных из CSV в БД заявок")
+    parser.add_argument("--db", default=database.DATABASE_PATH, help="путь к файлу БД")
+    parser.add_argument("--users", default="inputDataUsers.csv", help="CSV пользователей ('' - пропустить)")
+    parser.add_argument("--requests", default="inputDataRequests.csv", help="CSV заявок ('' - пропустить)")
+    parser.add_argument("--comments", default="inputDataComments.csv", help="CSV комментариев ('' - пропустить)")
+    args = parser.parse_args(argv)
+
+    files = {"users": args.users, "requests": args.requests, "comments": args.comments}
+    started = time.perf_counter()
+    try:
+        all_stats = run_import(args.db, files)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка импорта: {e}", file=sys.stderr)
+        return 1
+
+    total_read = 0
+    for stats in all_stats:
+        total_read += stats.read
+        if stats.rejected:
+            print(f"{stats.table}: отклонено {stats.rejected}, примеры:")
+        for line_no, reason in stats.reject_samples:
+            print(f"  строка {line_no}: {reason}")
+    elapsed = time.perf_counter() - started
+    print(f"Итого: {total_read} строк за {elapsed:.2f} с ({total_read / elapsed:,.0f} строк/с)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,28 @@
-from datetime import datetime, timedelta
-from typing import List
-from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks
+import asyncio
+import csv
+import io
+import json
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks, Query, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from jose import JWTError, jwt
+from pydantic import ValidationError
 import models
+import models_async
+import database
+import events
+import metrics
+import passwords
+import serialization
+from cache import LRUCache
+from etag import ETagMiddleware
+from serialization import FastJSONResponse
 from schemas import (
-    RequestCreate, RequestUpdate, RequestResponse,
+    RequestCreate, RequestUpdate, RequestBulkUpdate, RequestResponse,
     UserLogin, Token, TokenData, UserBase, UserCreate, UserResponse,
     CommentCreate, CommentResponse, StatisticsResponse
 )
@@ -16,6 +32,10 @@ from schemas import (
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+TOKEN_CACHE_SIZE = 10_000
+
+# Кэш проверенных токенов: токен -> user_id, до истечения exp
+token_cache = LRUCache(TOKEN_CACHE_SIZE)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -27,6 +47,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Условные GET (ETag по версии данных); подключается до CORS, чтобы 304 получали заголовки CORS
+app.add_middleware(ETagMiddleware, is_token_valid=lambda token: token_cache.get(token) is not None)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -34,8 +57,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag"],
 )
 
+# Метрики по маршрутам - внешним слоем, чтобы учитывать и ответы 304 и CORS
+app.add_middleware(metrics.MetricsMiddleware, routes=app.routes)
+
+@app.on_event("startup")
+def apply_db_schema():
+    """Применить схему БД (новые индексы и т.п.) при запуске"""
+    database.init_db()
+    # Заявки, загруженные в обход API (или до появления категорий)
+    models.backfill_problem_categories()
+
+@app.on_event("shutdown")
+def close_db_connections():
+    """Закрыть соединения пула и пулы потоков при остановке приложения"""
+    database.close_all_connections()
+    passwords.shutdown_hash_executor()
+
 # ---------- УТИЛИТЫ ДЛЯ JWT И РОЛЕЙ ----------
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -46,47 +86,53 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(login: str, password: str):
-    """Аутентификация пользователя"""
-    user = models.get_user_by_login(login)
+async def authenticate_user(login: str, password: str):
+    """Аутентификация пользователя (bcrypt выполняется в пуле потоков)"""
+    user = await models_async.get_user_by_login(login)
     if not user:
         return None
-    if user["password"] != password:
+    valid, new_hash = await passwords.verify_password_async(password, user["password"])
+    if not valid:
         return None
+    # Открытый текст или устаревшие параметры bcrypt - сохраняем новый хэш
+    if new_hash:
+        await models_async.update_user_password(user["user_id"], new_hash)
     return user
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserBase:
-    """Получить текущего пользователя из токена"""
+    """Получить текущего пользователя из токена.
+
+    Проверенные токены и записи пользователей кэшируются в памяти,
+    поэтому повторные запросы с тем же токеном не обращаются к БД;
+    при промахе пользователь читается в пуле потоков БД.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("user_id")
-        role: str = payload.get("role")
-        fio: str = payload.get("fio")
-        if user_id is None or role is None:
+    user_id = token_cache.get(token)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: int = payload.get("user_id")
+            role: str = payload.get("role")
+            if user_id is None or role is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        # Запись живет не дольше самого токена
+        token_cache.set(token, user_id, expires_at=payload.get("exp"))
 
-    user = models.get_user_by_id(user_id)
+    user = await models_async.get_cached_user(user_id)
     if user is None:
         raise credentials_exception
 
-    return UserBase(
-        user_id=user["user_id"],
-        fio=user["fio"],
-        phone=user["phone"],
-        login=user["login"],
-        role=user["role"]
-    )
+    return UserBase(**user)
 
 def require_roles(*allowed_roles: str):
     """Декоратор для проверки ролей"""
-    def role_checker(current_user: UserBase = Depends(get_current_user)):
+    async def role_checker(current_user: UserBase = Depends(get_current_user)):
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -100,7 +146,7 @@ def require_roles(*allowed_roles: str):
 @app.post("/token", response_model=Token, summary="Получить JWT токен")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Аутентификация пользователя и получение токена"""
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -124,7 +170,7 @@ async def read_users_me(current_user: UserBase = Depends(get_current_user)):
 # ---------- РЕГИСТРАЦИЯ ----------
 
 @app.post("/register", response_model=UserResponse, summary="Регистрация нового пользователя")
-def register_user(data: UserCreate):
+async def register_user(data: UserCreate):
     """Регистрация нового пользователя"""
     allowed_roles = ["Менеджер", "Оператор", "Специалист", "Заказчик"]
     if data.role not in allowed_roles:
@@ -133,17 +179,17 @@ def register_user(data: UserCreate):
             detail=f"Недопустимая роль. Разрешены: {', '.join(allowed_roles)}"
         )
 
-    if models.is_login_taken(data.login):
+    if await models_async.is_login_taken(data.login):
         raise HTTPException(
             status_code=400,
             detail="Пользователь с таким логином уже существует"
         )
 
-    user_id = models.create_user(
+    user_id = await models_async.create_user(
         fio=data.fio,
         phone=data.phone,
         login=data.login,
-        password=data.password,
+        password=await passwords.hash_password_async(data.password),
         role=data.role
     )
 
@@ -159,17 +205,118 @@ def register_user(data: UserCreate):
 
 # ---------- ЗАЯВКИ ----------
 
-@app.get("/requests", summary="Список всех заявок")
-def list_requests(current_user: UserBase = Depends(get_current_user)):
-    """Получить список заявок с учетом роли пользователя"""
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def get_request_filters(
+    current_user: UserBase,
+    statuses: Optional[List[str]] = None,
+    climate_tech_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    master_id: Optional[int] = None,
+    client_id: Optional[int] = None
+) -> dict:
+    """Фильтры заявок с учетом роли: заказчик видит свои, специалист - назначенные"""
+    filters = {
+        "statuses": statuses,
+        "climate_tech_type": climate_tech_type,
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "master_id": master_id,
+        "client_id": client_id
+    }
     if current_user.role == "Заказчик":
-        rows = models.get_requests_by_client(current_user.user_id)
+        filters["client_id"] = current_user.user_id
     elif current_user.role == "Специалист":
-        rows = models.get_requests_by_master(current_user.user_id)
+        filters["master_id"] = current_user.user_id
+    return filters
+
+@app.get("/requests", summary="Список заявок (постранично, с фильтрами)")
+def list_requests(
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                 description=f"Размер страницы (с курсором по умолчанию {DEFAULT_PAGE_SIZE})"),
+    payload_format: str = Query("objects", alias="format", pattern="^(objects|columns)$",
+                                description="objects - список объектов, columns - колонки и строки-массивы"),
+    request_status: Optional[List[str]] = Query(None, alias="status", description="Статус заявки (можно несколько)"),
+    climate_tech_type: Optional[str] = Query(None, description="Тип оборудования"),
+    date_from: Optional[date] = Query(None, description="Дата заявки от (включительно)"),
+    date_to: Optional[date] = Query(None, description="Дата заявки до (включительно)"),
+    master_id: Optional[int] = Query(None, description="ID специалиста"),
+    client_id: Optional[int] = Query(None, description="ID клиента"),
+    current_user: UserBase = Depends(get_current_user)
+):
+    """Получить страницу заявок с учетом роли пользователя.
+
+    Без limit и cursor возвращаются все заявки, как раньше; с ними - страница,
+    курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    Ответ кодируется напрямую (serialization.py), без jsonable_encoder.
+    """
+    filters = get_request_filters(
+        current_user, request_status, climate_tech_type, date_from, date_to, master_id, client_id
+    )
+    if limit is None and cursor:
+        limit = DEFAULT_PAGE_SIZE
+
+    try:
+        columns, rows, next_cursor = models.get_requests_page_rows(filters, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if payload_format == "columns":
+        content = serialization.columns_payload(columns, rows)
     else:
-        rows = models.get_all_requests()
-    
-    return [dict(row) for row in rows]
+        content = serialization.rows_to_objects(columns, rows)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(content, headers=headers)
+
+EXPORT_BATCH_SIZE = 500
+
+def export_as_ndjson(batches):
+    """Заявки построчно в формате NDJSON"""
+    for batch in batches:
+        yield b"".join(serialization.dumps(row) + b"\n" for row in batch)
+
+def export_as_csv(batches):
+    """Заявки в CSV (разделитель ';', комментарии - JSON в последней колонке)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    columns = None
+    for batch in batches:
+        for row in batch:
+            if columns is None:
+                columns = [c for c in row if c != "comments"]
+                writer.writerow(columns + ["comments"])
+            writer.writerow([row[c] for c in columns] + [json.dumps(row["comments"], ensure_ascii=False)])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+@app.get("/requests/export", summary="Потоковая выгрузка заявок с комментариями")
+def export_requests(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson или csv"),
+    request_status: Optional[List[str]] = Query(None, alias="status", description="Статус заявки (можно несколько)"),
+    climate_tech_type: Optional[str] = Query(None, description="Тип оборудования"),
+    date_from: Optional[date] = Query(None, description="Дата заявки от (включительно)"),
+    date_to: Optional[date] = Query(None, description="Дата заявки до (включительно)"),
+    master_id: Optional[int] = Query(None, description="ID специалиста"),
+    client_id: Optional[int] = Query(None, description="ID клиента"),
+    current_user: UserBase = Depends(get_current_user)
+):
+    """Выгрузить заявки и комментарии потоком, с теми же ограничениями по роли, что и список"""
+    filters = get_request_filters(
+        current_user, request_status, climate_tech_type, date_from, date_to, master_id, client_id
+    )
+    batches = models.iter_requests_with_comments(filters, EXPORT_BATCH_SIZE)
+
+    if export_format == "csv":
+        return StreamingResponse(
+            export_as_csv(batches),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="requests.csv"'}
+        )
+    return StreamingResponse(export_as_ndjson(batches), media_type="application/x-ndjson")
 
 @app.get("/requests/{request_id}", response_model=RequestResponse, summary="Получить заявку по ID")
 def get_request(request_id: int, current_user: UserBase = Depends(get_current_user)):
@@ -201,6 +348,116 @@ def add_request(data: RequestCreate, current_user: UserBase = Depends(require_ro
     request_id = models.create_request(data.dict())
     return {"message": "Заявка создана", "request_id": request_id}
 
+MAX_BULK_CREATE = 5000
+
+async def read_bulk_items(request: Request) -> list:
+    """Элементы тела запроса: JSON-массив или NDJSON (объект на строку).
+
+    Строка NDJSON, которая не разбирается, становится ошибкой своего
+    элемента (значение ValueError), а не всего запроса.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("application/x-ndjson"):
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный JSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Ожидается массив заявок")
+        if len(items) > MAX_BULK_CREATE:
+            raise HTTPException(status_code=400, detail=f"Не более {MAX_BULK_CREATE} заявок за запрос")
+        return items
+
+    items = []
+
+    def add_line(line: bytes):
+        if not line.strip():
+            return
+        if len(items) >= MAX_BULK_CREATE:
+            raise HTTPException(status_code=400, detail=f"Не более {MAX_BULK_CREATE} заявок за запрос")
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            items.append(ValueError(f"Некорректный JSON: {e}"))
+
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            add_line(line)
+    add_line(buffer)
+    return items
+
+@app.post("/requests/bulk", summary="Создать несколько заявок")
+async def add_requests_bulk(
+    request: Request,
+    current_user: UserBase = Depends(require_roles("Оператор", "Заказчик", "Менеджер"))
+):
+    """Создать заявки из JSON-массива или NDJSON-потока объектов RequestCreate.
+
+    Корректные заявки вставляются одной транзакцией (если ее отвергает
+    ограничение БД - по одной); ошибки возвращаются по номеру элемента
+    и не мешают остальным.
+    """
+    items = await read_bulk_items(request)
+    errors = []
+    valid = []  # (номер элемента, данные заявки)
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            errors.append({"index": index, "detail": str(item)})
+            continue
+        if not isinstance(item, dict):
+            errors.append({"index": index, "detail": "Ожидается объект заявки"})
+            continue
+        try:
+            data = RequestCreate(**item)
+        except ValidationError as e:
+            errors.append({"index": index, "detail": [
+                {"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()
+            ]})
+            continue
+        # Те же умолчания, что у POST /requests
+        if not data.request_status:
+            data.request_status = "Новая заявка"
+        if current_user.role == "Заказчик":
+            data.client_id = current_user.user_id
+        valid.append((index, data.dict()))
+
+    # Клиенты и специалисты должны существовать - проверка одним запросом
+    user_ids = {d["client_id"] for _, d in valid} | {d["master_id"] for _, d in valid if d["master_id"] is not None}
+    existing = await models_async.get_existing_user_ids(list(user_ids))
+    to_create = []
+    for index, request_data in valid:
+        unknown = [user_id for user_id in (request_data["client_id"], request_data["master_id"])
+                   if user_id is not None and user_id not in existing]
+        if unknown:
+            errors.append({"index": index, "detail": f"Пользователи не найдены: {unknown}"})
+        else:
+            to_create.append((index, request_data))
+
+    created = []
+    try:
+        request_ids = await models_async.create_requests([request_data for _, request_data in to_create])
+        created = [{"index": index, "request_id": request_id}
+                   for (index, _), request_id in zip(to_create, request_ids)]
+    except sqlite3.IntegrityError:
+        # Ограничение БД нарушено (например, пользователя удалили после проверки):
+        # транзакция откачена, заявки создаются по одной с ошибкой у своего элемента
+        for index, request_data in to_create:
+            try:
+                request_id = await models_async.create_request(request_data)
+            except sqlite3.IntegrityError as e:
+                errors.append({"index": index, "detail": f"Ошибка БД: {e}"})
+            else:
+                created.append({"index": index, "request_id": request_id})
+    errors.sort(key=lambda error: error["index"])
+    return {
+        "message": f"Создано заявок: {len(created)}",
+        "created": created,
+        "errors": errors
+    }
+
 @app.put("/requests/{request_id}", summary="Изменить заявку")
 def edit_request(
     request_id: int, 
@@ -226,6 +483,57 @@ def edit_request(
     
     return {"message": "Заявка обновлена"}
 
+MAX_BULK_UPDATE_IDS = 1000
+MAX_BULK_UPDATE_ROWS = 10_000  # заявок, попадающих под фильтр
+
+@app.patch("/requests", summary="Массовое изменение заявок")
+def bulk_edit_requests(
+    data: RequestBulkUpdate,
+    current_user: UserBase = Depends(require_roles("Оператор", "Менеджер", "Специалист"))
+):
+    """Изменить заявки по списку ID и/или фильтру одним запросом в одной транзакции.
+
+    Права те же, что у PUT /requests/{request_id}: специалист меняет только
+    свои заявки, оператор не меняет ответственного специалиста.
+    """
+    request_ids = list(dict.fromkeys(data.request_ids or []))
+    if len(request_ids) > MAX_BULK_UPDATE_IDS:
+        raise HTTPException(status_code=400, detail=f"Не более {MAX_BULK_UPDATE_IDS} заявок за запрос")
+
+    filter_values = data.filter.dict() if data.filter else {}
+    # Пустые значения фильтра (например, "") условий не дают - проверяются сами условия,
+    # до добавления ограничений по роли
+    filter_conditions, _ = models.build_request_filters(filter_values)
+    if not request_ids and not filter_conditions:
+        raise HTTPException(status_code=400, detail="Укажите ID заявок или фильтр")
+    filters = get_request_filters(current_user, **filter_values)
+
+    if request_ids:
+        # Проверка прав доступа сразу по всем заявкам
+        access = models.get_requests_access(request_ids)
+        missing = [request_id for request_id in request_ids if request_id not in access]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Заявки не найдены: {missing}")
+        if current_user.role == "Специалист" and any(
+            request_data["master_id"] != current_user.user_id for request_data in access.values()
+        ):
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+
+    changes = data.changes.dict(exclude_unset=True)
+    # Оператор не может менять ответственного специалиста
+    if current_user.role == "Оператор":
+        changes.pop("master_id", None)
+    if not changes:
+        raise HTTPException(status_code=400, detail="Нет изменений")
+
+    try:
+        updated_ids = models.bulk_update_requests(
+            changes, request_ids, filters, max_rows=None if request_ids else MAX_BULK_UPDATE_ROWS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Заявки обновлены", "updated": len(updated_ids), "request_ids": updated_ids}
+
 @app.delete("/requests/{request_id}", summary="Удалить заявку")
 def remove_request(
     request_id: int, 
@@ -241,8 +549,67 @@ def remove_request(
     
     return {"message": "Заявка удалена"}
 
+# ---------- ПОИСК ----------
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+@app.get("/search", summary="Полнотекстовый поиск заявок")
+def search_requests(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Слова из описания проблемы, модели или комментариев"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT, description="Размер страницы"),
+    offset: int = Query(0, ge=0, description="Смещение из заголовка X-Next-Offset"),
+    request_status: Optional[List[str]] = Query(None, alias="status", description="Статус заявки (можно несколько)"),
+    climate_tech_type: Optional[str] = Query(None, description="Тип оборудования"),
+    date_from: Optional[date] = Query(None, description="Дата заявки от (включительно)"),
+    date_to: Optional[date] = Query(None, description="Дата заявки до (включительно)"),
+    master_id: Optional[int] = Query(None, description="ID специалиста"),
+    client_id: Optional[int] = Query(None, description="ID клиента"),
+    current_user: UserBase = Depends(get_current_user)
+):
+    """Найти заявки по тексту (по релевантности) с учетом роли пользователя.
+
+    Смещение следующей страницы возвращается в заголовке X-Next-Offset.
+    """
+    filters = get_request_filters(
+        current_user, request_status, climate_tech_type, date_from, date_to, master_id, client_id
+    )
+    rows = models.search_requests(q, filters, limit + 1, offset)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return rows
+
 # ---------- КОММЕНТАРИИ ----------
 
+MAX_COMMENTS_BATCH = 500
+
+@app.get("/comments", response_model=Dict[int, List[CommentResponse]], summary="Комментарии по нескольким заявкам")
+def get_comments_batch(
+    request_ids: Optional[List[int]] = Query(None, description="ID заявок (параметр повторяется)"),
+    current_user: UserBase = Depends(get_current_user)
+):
+    """Получить комментарии к нескольким заявкам, сгруппированные по ID заявки"""
+    if not request_ids:
+        raise HTTPException(status_code=400, detail="Не указаны ID заявок")
+    request_ids = list(dict.fromkeys(request_ids))
+    if len(request_ids) > MAX_COMMENTS_BATCH:
+        raise HTTPException(status_code=400, detail=f"Не более {MAX_COMMENTS_BATCH} заявок за запрос")
+
+    # Проверка прав доступа сразу по всем заявкам
+    access = models.get_requests_access(request_ids)
+    missing = [request_id for request_id in request_ids if request_id not in access]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Заявки не найдены: {missing}")
+    for request_data in access.values():
+        if current_user.role == "Заказчик" and request_data["client_id"] != current_user.user_id:
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+        if current_user.role == "Специалист" and request_data["master_id"] != current_user.user_id:
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+
+    return models.get_comments_by_requests(request_ids)
+
 @app.get("/requests/{request_id}/comments", response_model=List[CommentResponse], summary="Комментарии по заявке")
 def get_comments(request_id: int, current_user: UserBase = Depends(get_current_user)):
     """Получить комментарии к заявке"""
@@ -303,6 +670,17 @@ def stats_average_time(current_user: UserBase = Depends(require_roles("Мене
     avg_days = models.get_average_completion_time_days()
     return {"average_completion_time_days": avg_days}
 
+@app.get("/stats/status", summary="Количество заявок по статусам")
+def stats_status(
+    date_from: Optional[date] = Query(None, description="Дата начала (от)"),
+    date_to: Optional[date] = Query(None, description="Дата начала (до)"),
+    current_user: UserBase = Depends(get_current_user)
+):
+    """Получить количество заявок по статусам за период (заказчик и специалист - по своим)"""
+    filters = get_request_filters(current_user, date_from=date_from, date_to=date_to)
+    status_counts = models.get_status_counts(filters)
+    return {"total": sum(status_counts.values()), "status_counts": status_counts}
+
 @app.get("/stats/problems", summary="Статистика по типам неисправностей")
 def stats_problems(current_user: UserBase = Depends(require_roles("Менеджер"))):
     """Получить статистику по типам неисправностей"""
@@ -311,12 +689,45 @@ def stats_problems(current_user: UserBase = Depends(require_roles("Менедж
 
 @app.get("/stats/all", summary="Вся статистика")
 def all_stats(current_user: UserBase = Depends(require_roles("Менеджер"))):
-    """Получить всю статистику"""
-    return {
-        "completed_requests_count": models.get_completed_requests_count(),
-        "average_completion_time_days": models.get_average_completion_time_days(),
-        "problem_statistics": models.get_problem_statistics()
+    """Получить всю статистику (один запрос, кэшируется на несколько секунд)"""
+    return models.get_all_statistics_cached()
+
+@app.get("/stats/specialists", summary="Статистика по специалистам")
+def stats_specialists(current_user: UserBase = Depends(require_roles("Менеджер"))):
+    """Получить сводку по всем специалистам: заявки по статусам, эффективность, среднее время"""
+    return models.get_specialists_statistics()
+
+@app.get("/stats/users/{user_id}", summary="Статистика пользователя")
+def stats_user(
+    user_id: int,
+    request_status: Optional[List[str]] = Query(None, alias="status", description="Статус заявки (можно несколько)"),
+    climate_tech_type: Optional[str] = Query(None, description="Тип оборудования"),
+    date_from: Optional[date] = Query(None, description="Дата начала (от)"),
+    date_to: Optional[date] = Query(None, description="Дата начала (до)"),
+    current_user: UserBase = Depends(require_roles("Специалист", "Менеджер"))
+):
+    """Получить статистику по заявкам пользователя (специалист - только свою)"""
+    if current_user.role == "Специалист" and current_user.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Нет доступа к статистике другого пользователя")
+    user = models.get_cached_user(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+    filters = {
+        "statuses": request_status,
+        "climate_tech_type": climate_tech_type,
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
     }
+    # Заявки пользователя определяются его ролью; оператор и менеджер - все заявки
+    if user["role"] == "Заказчик":
+        filters["client_id"] = user_id
+    elif user["role"] == "Специалист":
+        filters["master_id"] = user_id
+
+    stats = models.get_user_statistics(filters)
+    stats.update({"user_id": user_id, "fio": user["fio"], "role": user["role"]})
+    return stats
 
 # ---------- ПОЛЬЗОВАТЕЛИ ----------
 
@@ -333,6 +744,83 @@ def list_users(current_user: UserBase = Depends(require_roles("Менеджер"
         cursor.execute("SELECT user_id, fio, phone, login, role FROM users ORDER BY role, fio")
         return [dict(row) for row in cursor.fetchall()]
 
+# ---------- УВЕДОМЛЕНИЯ (SSE) ----------
+
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_RETRY_MILLISECONDS = 3000
+
+def format_sse(event: Dict) -> bytes:
+    """Событие в формате text/event-stream"""
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+        event["id"].encode("ascii"), event["type"].encode("utf-8"), serialization.dumps(event)
+    )
+
+async def stream_events(accepts: Callable[[Dict], bool], last_event_id: Optional[str]):
+    """Поток событий с комментариями-пингами, пока клиент подключен.
+
+    Подписка создается при первой итерации, рядом с отпиской в finally:
+    если клиент отключился раньше, подписчик не остается в брокере.
+    """
+    subscription = events.broadcaster.subscribe(accepts, last_event_id)
+    try:
+        yield b"retry: %d\n\n" % EVENTS_RETRY_MILLISECONDS
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Пинг держит соединение через прокси и выявляет отключившихся клиентов
+                yield b": ping\n\n"
+                continue
+            if event is None:
+                # Клиент не успевал читать: закрываем, он переподключится с Last-Event-ID
+                return
+            yield format_sse(event)
+    finally:
+        events.broadcaster.unsubscribe(subscription)
+
+@app.get("/events", summary="Поток уведомлений об изменениях заявок (Server-Sent Events)")
+async def stream_request_events(
+    request: Request,
+    last_event_id: Optional[str] = Query(None, description="Продолжить после события с этим ID (или заголовок Last-Event-ID)"),
+    current_user: UserBase = Depends(get_current_user)
+):
+    """Уведомления о создании, изменении (статус, исполнитель и др.), удалении заявок и новых комментариях.
+
+    Видимость - как у списка заявок: заказчик получает события своих заявок,
+    специалист - назначенных ему (в том числе снятых с него), оператор и
+    менеджер - все. Событие содержит только ID и статус заявки; данные
+    заявки клиент запрашивает сам. Событие resync означает, что пропущенные
+    события недоступны (сервер перезапущен или ID слишком старый) и данные
+    нужно перечитать.
+    """
+    if last_event_id is None:
+        last_event_id = request.headers.get("last-event-id") or None
+
+    role, user_id = current_user.role, current_user.user_id
+    return StreamingResponse(
+        stream_events(lambda event: events.is_visible(event, role, user_id), last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ---------- МЕТРИКИ ----------
+
+async def require_metrics_access(token: str = Depends(oauth2_scheme)):
+    """Доступ к метрикам: токен METRICS_TOKEN (Prometheus) или JWT менеджера"""
+    if metrics.is_metrics_token(token):
+        return
+    current_user = await get_current_user(token)
+    if current_user.role != "Менеджер":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Доступ запрещен для роли {current_user.role}"
+        )
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+def get_metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    return Response(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
 # ---------- ЗАПУСК ПРИЛОЖЕНИЯ ----------
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+"""Метрики API в текстовом формате Prometheus.
+
+MetricsMiddleware считает по каждому маршруту (шаблону пути, например
+/requests/{request_id}) число запросов по кодам ответа, гистограммы
+времени ответа, размера ответа, числа запросов к БД и их суммарного
+времени. Запросы к БД учитываются соединениями database.py через
+database.current_query_stats.
+
+Метрики хранятся в памяти процесса: каждый воркер uvicorn отдает свои,
+суммирует их Prometheus. Наблюдение - поиск корзины и несколько
+сложений под блокировкой, поэтому метрики можно не отключать.
+
+/metrics отдается только с токеном METRICS_TOKEN (переменная окружения,
+для Prometheus: authorization: credentials) или с JWT менеджера.
+"""
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+from starlette.routing import Match
+
+import database
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+DB_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# Запросы, не попавшие ни в один маршрут (404): путь не используется как метка
+UNMATCHED_ROUTE = "unmatched"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Статический токен сборщика метрик; пустой - только JWT менеджера
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
+def escape_label(value: str) -> str:
+    """Значение метки в формате Prometheus"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """{name="value",...} (extra - готовая дополнительная метка, например le)"""
+    parts = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Счетчик с метками"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in values:
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с метками и фиксированными границами корзин"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, list] = {}  # метки -> [счетчики корзин..., +Inf, сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound if bound == "+Inf" else format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+ROUTE_LABELS = ("method", "route")
+
+requests_total = Counter(
+    "http_requests_total", "Число HTTP-запросов", ("method", "route", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "Время ответа, с", ROUTE_LABELS, LATENCY_BUCKETS)
+response_size = Histogram(
+    "http_response_size_bytes", "Размер тела ответа, байт", ROUTE_LABELS, SIZE_BUCKETS)
+db_queries = Histogram(
+    "http_request_db_queries", "Число запросов к БД на HTTP-запрос", ROUTE_LABELS, QUERY_COUNT_BUCKETS)
+db_duration = Histogram(
+    "http_request_db_seconds", "Время запросов к БД на HTTP-запрос, с", ROUTE_LABELS, DB_TIME_BUCKETS)
+
+ALL_METRICS = (requests_total, request_duration, response_size, db_queries, db_duration)
+
+
+def render_metrics() -> bytes:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def is_metrics_token(token: str) -> bool:
+    """Совпадает ли токен с METRICS_TOKEN (сравнение за постоянное время)"""
+    return bool(METRICS_TOKEN) and secrets.compare_digest(token.encode("utf-8"), METRICS_TOKEN.encode("utf-8"))
+
+
+def route_template(scope, routes) -> str:
+    """Шаблон пути маршрута (метка с ограниченным числом значений)"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Ответ без вызова маршрутизатора (например, 304 из ETagMiddleware)
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: метрики по маршрутам для всех HTTP-запросов.
+
+    Подключается последним (внешним), чтобы учитывать и ответы других
+    middleware. routes - список маршрутов приложения (app.routes).
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = database.QueryStats()
+        token = database.current_query_stats.set(stats)
+        status_code = 500
+        body_size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            database.current_query_stats.reset(token)
+            labels = (scope["method"], route_template(scope, self.routes))
+            requests_total.inc(labels + (str(status_code),))
+            request_duration.observe(labels, elapsed)
+            response_size.observe(labels, body_size)
+            db_queries.observe(labels, stats.count)
+            db_duration.observe(labels, stats.seconds)
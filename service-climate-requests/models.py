@@ -1,29 +1,14 @@
-import sqlite3
-from typing import List, Optional, Dict, Any
-from contextlib import contextmanager
+import base64
+import functools
+import json
+import re
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from datetime import datetime
 
-DATABASE_PATH = "repair_requests.db"
-
-@contextmanager
-def get_db_connection():
-    """Контекстный менеджер для соединения с БД"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
-
-@contextmanager
-def get_db_cursor():
-    """Контекстный менеджер для работы с курсором БД"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            yield cursor, conn
-        finally:
-            cursor.close()
+import events
+import problem_categories
+from cache import LRUCache, TTLCache
+from database import after_commit, get_data_version, get_db_connection, get_db_cursor, open_connection, run_write
 
 # ---------- ПОЛЬЗОВАТЕЛИ ----------
 
@@ -41,16 +26,66 @@ def get_user_by_id(user_id: int) -> Optional[Dict]:
         row = cursor.fetchone()
         return dict(row) if row else None
 
-def create_user(fio: str, phone: str, login: str, password: str, role: str) -> int:
-    """Создать нового пользователя"""
-    with get_db_cursor() as (cursor, conn):
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL_SECONDS = 60
+USER_PUBLIC_FIELDS = ("user_id", "fio", "phone", "login", "role")
+user_cache = LRUCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def get_cached_user(user_id: int) -> Optional[Dict]:
+    """Получить пользователя (без пароля) из кэша, при промахе - из БД.
+
+    Кэш локален для процесса; изменения пользователя в других воркерах
+    видны не позже чем через USER_CACHE_TTL_SECONDS.
+    """
+    user = user_cache.get(user_id)
+    if user is None:
+        row = get_user_by_id(user_id)
+        if row is None:
+            return None
+        user = {field: row[field] for field in USER_PUBLIC_FIELDS}
+        user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: int):
+    """Сбросить кэш пользователя после его изменения"""
+    user_cache.pop(user_id)
+
+def _insert_user(fio: str, phone: str, login: str, password: str, role: str) -> int:
+    with get_db_cursor() as (cursor, _):
         cursor.execute("""
             INSERT INTO users (fio, phone, login, password, role)
             VALUES (?, ?, ?, ?, ?)
         """, (fio, phone, login, password, role))
-        conn.commit()
         return cursor.lastrowid
 
+def create_user(fio: str, phone: str, login: str, password: str, role: str) -> int:
+    """Создать нового пользователя"""
+    user_id = run_write(_insert_user, fio, phone, login, password, role)
+    invalidate_user(user_id)
+    return user_id
+
+def _update_user_password(user_id: int, password_hash: str) -> bool:
+    with get_db_cursor() as (cursor, _):
+        cursor.execute("UPDATE users SET password = ? WHERE user_id = ?", (password_hash, user_id))
+        return cursor.rowcount > 0
+
+def update_user_password(user_id: int, password_hash: str) -> bool:
+    """Заменить хэш пароля пользователя"""
+    updated = run_write(_update_user_password, user_id, password_hash)
+    invalidate_user(user_id)
+    return updated
+
+def get_existing_user_ids(user_ids: List[int]) -> set:
+    """Какие из ID пользователей есть в БД (одним запросом)"""
+    if not user_ids:
+        return set()
+    with get_db_cursor() as (cursor, _):
+        cursor.execute(f"""
+            SELECT user_id FROM users
+            WHERE user_id IN ({', '.join('?' * len(user_ids))})
+        """, list(user_ids))
+        return {row[0] for row in cursor.fetchall()}
+
 def is_login_taken(login: str) -> bool:
     """Проверить, занят ли логин"""
     with get_db_cursor() as (cursor, _):
@@ -66,6 +101,86 @@ def get_all_requests() -> List[Dict]:
         cursor.execute("SELECT * FROM requests ORDER BY start_date DESC")
         return [dict(row) for row in cursor.fetchall()]
 
+def encode_page_cursor(row: Dict) -> str:
+    """Курсор страницы - позиция последней выданной заявки"""
+    raw = json.dumps([row["start_date"], row["request_id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_page_cursor(cursor: str) -> Tuple[str, int]:
+    """Разобрать курсор страницы (ValueError при некорректном значении)"""
+    try:
+        start_date, request_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+    if not isinstance(start_date, str) or not isinstance(request_id, int):
+        raise ValueError("Некорректный курсор")
+    return start_date, request_id
+
+def build_request_filters(filters: Dict) -> Tuple[List[str], List[Any]]:
+    """Собрать условия WHERE по фильтрам заявок"""
+    conditions = []
+    params = []
+
+    if filters.get("statuses"):
+        conditions.append(f"request_status IN ({', '.join('?' * len(filters['statuses']))})")
+        params.extend(filters["statuses"])
+
+    if filters.get("climate_tech_type"):
+        conditions.append("climate_tech_type = ?")
+        params.append(filters["climate_tech_type"])
+
+    if filters.get("date_from"):
+        conditions.append("start_date >= ?")
+        params.append(filters["date_from"])
+
+    if filters.get("date_to"):
+        conditions.append("start_date <= ?")
+        params.append(filters["date_to"])
+
+    if filters.get("master_id") is not None:
+        conditions.append("master_id = ?")
+        params.append(filters["master_id"])
+
+    if filters.get("client_id") is not None:
+        conditions.append("client_id = ?")
+        params.append(filters["client_id"])
+
+    return conditions, params
+
+def get_requests_page_rows(
+    filters: Dict, limit: Optional[int], cursor: Optional[str] = None
+) -> Tuple[List[str], List[tuple], Optional[str]]:
+    """Страница заявок кортежами: (колонки, строки, курсор следующей страницы).
+
+    Keyset-пагинация по (start_date, request_id); строки не копируются в словари.
+    limit=None - все заявки после курсора одним ответом.
+    """
+    conditions, params = build_request_filters(filters)
+
+    if cursor:
+        start_date, request_id = decode_page_cursor(cursor)
+        conditions.append("(start_date < ? OR (start_date = ? AND request_id < ?))")
+        params.extend([start_date, start_date, request_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with get_db_cursor() as (db_cursor, _):
+        db_cursor.row_factory = None
+        db_cursor.execute(f"""
+            SELECT * FROM requests
+            {where}
+            ORDER BY start_date DESC, request_id DESC
+            LIMIT ?
+        """, params + [-1 if limit is None else limit + 1])
+        columns = [column[0] for column in db_cursor.description]
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        del rows[limit:]
+        last = dict(zip(columns, rows[-1]))
+        next_cursor = encode_page_cursor(last)
+    return columns, rows, next_cursor
+
 def get_request_by_id(request_id: int) -> Optional[Dict]:
     """Получить заявку по ID"""
     with get_db_cursor() as (cursor, _):
@@ -73,14 +188,15 @@ def get_request_by_id(request_id: int) -> Optional[Dict]:
         row = cursor.fetchone()
         return dict(row) if row else None
 
-def create_request(request_data: Dict) -> int:
-    """Создать новую заявку"""
+def _insert_request(request_data: Dict) -> int:
     with get_db_cursor() as (cursor, conn):
+        category_id = problem_categories.categorize(conn, request_data["problem_description"])
         cursor.execute("""
             INSERT INTO requests (
                 start_date, climate_tech_type, climate_tech_model,
-                problem_description, request_status, master_id, client_id
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                problem_description, request_status, master_id, client_id,
+                problem_category_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             request_data["start_date"],
             request_data["climate_tech_type"],
@@ -88,53 +204,221 @@ def create_request(request_data: Dict) -> int:
             request_data["problem_description"],
             request_data["request_status"],
             request_data.get("master_id"),
-            request_data["client_id"]
+            request_data["client_id"],
+            category_id
         ))
-        conn.commit()
         return cursor.lastrowid
 
-def update_request(request_id: int, update_data: Dict) -> bool:
-    """Обновить заявку"""
+def create_request(request_data: Dict) -> int:
+    """Создать новую заявку"""
+    request_id = run_write(_insert_request, request_data)
+    invalidate_statistics()
+    publish_request_event(events.REQUEST_CREATED, dict(request_data, request_id=request_id))
+    return request_id
+
+def _insert_requests(items: List[Dict]) -> List[int]:
     with get_db_cursor() as (cursor, conn):
-        # Собираем поля для обновления
-        fields = []
-        values = []
-        
-        if "request_status" in update_data and update_data["request_status"]:
-            fields.append("request_status = ?")
-            values.append(update_data["request_status"])
-        
-        if "problem_description" in update_data and update_data["problem_description"]:
-            fields.append("problem_description = ?")
-            values.append(update_data["problem_description"])
-        
-        if "master_id" in update_data:
-            fields.append("master_id = ?")
-            values.append(update_data["master_id"])
-        
-        if "completion_date" in update_data and update_data["completion_date"]:
-            fields.append("completion_date = ?")
-            values.append(update_data["completion_date"])
-        
-        if "repair_parts" in update_data:
-            fields.append("repair_parts = ?")
-            values.append(update_data["repair_parts"])
-        
+        if not conn.in_transaction:
+            # Диапазон ID выделяется под блокировкой записи (в очереди писателя она уже взята)
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT IFNULL(MAX(request_id), 0) + 1 FROM requests")
+        first_id = cursor.fetchone()[0]
+        categories = {}
+        rows = []
+        for request_id, item in enumerate(items, start=first_id):
+            description = item["problem_description"]
+            if description not in categories:
+                categories[description] = problem_categories.categorize(conn, description)
+            rows.append((
+                request_id,
+                item["start_date"],
+                item["climate_tech_type"],
+                item["climate_tech_model"],
+                description,
+                item["request_status"],
+                item.get("master_id"),
+                item["client_id"],
+                categories[description]
+            ))
+        cursor.executemany("""
+            INSERT INTO requests (
+                request_id, start_date, climate_tech_type, climate_tech_model,
+                problem_description, request_status, master_id, client_id,
+                problem_category_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        return [row[0] for row in rows]
+
+def create_requests(items: List[Dict]) -> List[int]:
+    """Создать несколько заявок одним executemany в одной транзакции, вернуть их ID по порядку"""
+    if not items:
+        return []
+    request_ids = run_write(_insert_requests, items)
+    invalidate_statistics()
+    for request_id, item in zip(request_ids, items):
+        publish_request_event(events.REQUEST_CREATED, dict(item, request_id=request_id))
+    return request_ids
+
+def build_request_update(conn, update_data: Dict) -> Tuple[List[str], List[Any]]:
+    """Присваивания SET и их значения по изменяемым полям заявки"""
+    # Собираем поля для обновления
+    fields = []
+    values = []
+    
+    if "request_status" in update_data and update_data["request_status"]:
+        fields.append("request_status = ?")
+        values.append(update_data["request_status"])
+    
+    if "problem_description" in update_data and update_data["problem_description"]:
+        fields.append("problem_description = ?")
+        values.append(update_data["problem_description"])
+        fields.append("problem_category_id = ?")
+        values.append(problem_categories.categorize(conn, update_data["problem_description"]))
+    
+    if "master_id" in update_data:
+        fields.append("master_id = ?")
+        values.append(update_data["master_id"])
+    
+    if "completion_date" in update_data and update_data["completion_date"]:
+        fields.append("completion_date = ?")
+        values.append(update_data["completion_date"])
+    
+    if "repair_parts" in update_data:
+        fields.append("repair_parts = ?")
+        values.append(update_data["repair_parts"])
+
+    return fields, values
+
+def changed_fields(fields: List[str]) -> List[str]:
+    """Имена изменяемых полей по присваиваниям SET (для уведомлений)"""
+    return [field.split(" ")[0] for field in fields if not field.startswith("problem_category_id")]
+
+# Поля заявки, передаваемые в уведомлениях (по client_id и master_id события фильтруются по ролям)
+EVENT_RETURNING = "RETURNING request_id, client_id, master_id, request_status"
+
+def publish_request_event(event_type: str, row: Dict, **fields):
+    """Уведомить подписчиков /events об изменении заявки.
+
+    Вызывается после run_write; если запись шла в транзакции вызывающего,
+    событие публикуется только после ее фиксации.
+    """
+    after_commit(functools.partial(
+        events.publish,
+        event_type,
+        request_id=row["request_id"],
+        client_id=row["client_id"],
+        master_id=row.get("master_id"),
+        request_status=row.get("request_status"),
+        **fields
+    ))
+
+def _update_request(request_id: int, update_data: Dict) -> Optional[Tuple[Dict, List[str]]]:
+    with get_db_cursor() as (cursor, conn):
+        fields, values = build_request_update(conn, update_data)
         if not fields:
-            return False
-        
+            return None
+
+        previous_master_id = None
+        if "master_id" in update_data:
+            cursor.execute("SELECT master_id FROM requests WHERE request_id = ?", (request_id,))
+            previous = cursor.fetchone()
+            previous_master_id = previous[0] if previous else None
+
         values.append(request_id)
-        query = f"UPDATE requests SET {', '.join(fields)} WHERE request_id = ?"
+        query = f"UPDATE requests SET {', '.join(fields)} WHERE request_id = ? {EVENT_RETURNING}"
         cursor.execute(query, values)
-        conn.commit()
-        return cursor.rowcount > 0
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        if previous_master_id != row["master_id"]:
+            row["previous_master_id"] = previous_master_id
+        return row, changed_fields(fields)
+
+def update_request(request_id: int, update_data: Dict) -> bool:
+    """Обновить заявку"""
+    result = run_write(_update_request, request_id, update_data)
+    invalidate_statistics()
+    if result is None:
+        return False
+    row, changes = result
+    publish_request_event(events.REQUEST_UPDATED, row, changes=changes,
+                          previous_master_id=row.get("previous_master_id"))
+    return True
+
+def _bulk_update_requests(update_data: Dict, request_ids: Optional[List[int]], filters: Optional[Dict],
+                          max_rows: Optional[int]) -> Tuple[List[Dict], List[str]]:
+    conditions, params = build_request_filters(filters or {})
+    if request_ids:
+        conditions.append(f"request_id IN ({', '.join('?' * len(request_ids))})")
+        params.extend(request_ids)
+    if not conditions:
+        raise ValueError("Не указаны заявки для изменения")
+
+    with get_db_cursor() as (cursor, conn):
+        if max_rows is not None:
+            # Подсчет в той же транзакции, что и UPDATE, до изменения строк
+            cursor.execute(f"SELECT COUNT(*) FROM requests WHERE {' AND '.join(conditions)}", params)
+            matched = cursor.fetchone()[0]
+            if matched > max_rows:
+                raise ValueError(f"Условиям соответствует заявок: {matched}, не более {max_rows} за запрос")
+
+        fields, values = build_request_update(conn, update_data)
+        if not fields:
+            return [], []
+
+        previous_masters = {}
+        if "master_id" in update_data:
+            # Прежние исполнители - чтобы снятый с заявок специалист тоже получил уведомление
+            cursor.execute(f"""
+                SELECT request_id, master_id FROM requests
+                WHERE {' AND '.join(conditions)}
+            """, params)
+            previous_masters = dict(cursor.fetchall())
+
+        cursor.execute(f"""
+            UPDATE requests SET {', '.join(fields)}
+            WHERE {' AND '.join(conditions)}
+            {EVENT_RETURNING}
+        """, values + params)
+        rows = []
+        for row in cursor.fetchall():
+            row = dict(row)
+            previous_master_id = previous_masters.get(row["request_id"], row["master_id"])
+            if previous_master_id != row["master_id"]:
+                row["previous_master_id"] = previous_master_id
+            rows.append(row)
+        return rows, changed_fields(fields)
+
+def bulk_update_requests(update_data: Dict, request_ids: Optional[List[int]] = None,
+                         filters: Optional[Dict] = None, max_rows: Optional[int] = None) -> List[int]:
+    """Изменить заявки по списку ID и/или фильтрам одним UPDATE в одной транзакции.
+
+    Возвращает ID измененных заявок; ValueError, если не заданы ни ID, ни фильтры
+    или условиям соответствует больше max_rows заявок (тогда ничего не меняется).
+    """
+    rows, changes = run_write(_bulk_update_requests, update_data, request_ids, filters, max_rows)
+    if rows:
+        invalidate_statistics()
+    for row in rows:
+        publish_request_event(events.REQUEST_UPDATED, row, changes=changes,
+                              previous_master_id=row.get("previous_master_id"))
+    return sorted(row["request_id"] for row in rows)
+
+def _delete_request(request_id: int) -> Optional[Dict]:
+    with get_db_cursor() as (cursor, _):
+        cursor.execute(f"DELETE FROM requests WHERE request_id = ? {EVENT_RETURNING}", (request_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
 
 def delete_request(request_id: int) -> bool:
     """Удалить заявку"""
-    with get_db_cursor() as (cursor, conn):
-        cursor.execute("DELETE FROM requests WHERE request_id = ?", (request_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+    row = run_write(_delete_request, request_id)
+    invalidate_statistics()
+    if row is None:
+        return False
+    publish_request_event(events.REQUEST_DELETED, row)
+    return True
 
 def get_requests_by_client(client_id: int) -> List[Dict]:
     """Получить заявки клиента"""
@@ -148,6 +432,97 @@ def get_requests_by_master(master_id: int) -> List[Dict]:
         cursor.execute("SELECT * FROM requests WHERE master_id = ? ORDER BY start_date DESC", (master_id,))
         return [dict(row) for row in cursor.fetchall()]
 
+def iter_requests_with_comments(filters: Dict, batch_size: int = 500) -> Iterator[List[Dict]]:
+    """Порциями выдать заявки вместе с комментариями (для потоковой выгрузки).
+
+    Использует отдельное соединение в одной читающей транзакции, поэтому
+    выгрузка согласована и не держит соединение пула между порциями.
+    """
+    conditions, params = build_request_filters(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = open_connection()
+    try:
+        conn.execute("BEGIN")
+        requests_cursor = conn.execute(f"SELECT * FROM requests {where} ORDER BY request_id", params)
+        while True:
+            rows = requests_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            batch = []
+            by_id = {}
+            for row in rows:
+                request = dict(row)
+                request["comments"] = []
+                by_id[request["request_id"]] = request
+                batch.append(request)
+
+            comments_cursor = conn.execute(f"""
+                SELECT c.*, u.fio as master_name
+                FROM comments c
+                LEFT JOIN users u ON c.master_id = u.user_id
+                WHERE c.request_id IN ({', '.join('?' * len(by_id))})
+                ORDER BY c.request_id, c.created_at
+            """, list(by_id))
+            for comment in comments_cursor:
+                by_id[comment["request_id"]]["comments"].append(dict(comment))
+            comments_cursor.close()
+
+            yield batch
+    finally:
+        conn.close()
+
+# ---------- ПОИСК ----------
+
+SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def build_search_query(text: str) -> Optional[str]:
+    """Строка поиска -> запрос FTS5: все слова, каждое как префикс.
+
+    Спецсимволы синтаксиса FTS5 отбрасываются, поэтому пользовательский
+    ввод не может сломать запрос. Префиксы частично покрывают окончания
+    русских слов ("охлажд" находит "охлаждает" и "охлаждение").
+    """
+    tokens = SEARCH_TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def search_requests(text: str, filters: Dict, limit: int, offset: int = 0) -> List[Dict]:
+    """Заявки, у которых описание, модель или комментарии совпадают с запросом.
+
+    Результаты упорядочены по релевантности (bm25, лучшее совпадение
+    по заявке и ее комментариям), к ним применяются фильтры заявок.
+    """
+    match = build_search_query(text)
+    if match is None:
+        return []
+    conditions, params = build_request_filters(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with get_db_cursor() as (cursor, _):
+        cursor.execute(f"""
+            WITH hits AS (
+                SELECT rowid AS request_id, bm25(requests_fts) AS score
+                FROM requests_fts
+                WHERE requests_fts MATCH ?
+                UNION ALL
+                SELECT c.request_id, bm25(comments_fts) AS score
+                FROM comments_fts
+                JOIN comments c ON c.comment_id = comments_fts.rowid
+                WHERE comments_fts MATCH ?
+            ), ranked AS (
+                SELECT request_id, MIN(score) AS score FROM hits GROUP BY request_id
+            )
+            SELECT requests.*, ranked.score AS rank
+            FROM ranked
+            JOIN requests ON requests.request_id = ranked.request_id
+            {where}
+            ORDER BY ranked.score, requests.request_id DESC
+            LIMIT ? OFFSET ?
+        """, [match, match] + params + [limit, offset])
+        return [dict(row) for row in cursor.fetchall()]
 
 
 # ---------- КОММЕНТАРИИ ----------
@@ -164,58 +539,323 @@ def get_comments_by_request(request_id: int) -> List[Dict]:
         """, (request_id,))
         return [dict(row) for row in cursor.fetchall()]
 
-def create_comment(message: str, master_id: int, request_id: int) -> int:
-    """Создать комментарий"""
-    with get_db_cursor() as (cursor, conn):
+def get_requests_access(request_ids: List[int]) -> Dict[int, Dict]:
+    """Клиент и мастер для каждой из заявок (одним запросом, для проверки доступа)"""
+    with get_db_cursor() as (cursor, _):
+        cursor.execute(f"""
+            SELECT request_id, client_id, master_id
+            FROM requests
+            WHERE request_id IN ({', '.join('?' * len(request_ids))})
+        """, list(request_ids))
+        return {row["request_id"]: dict(row) for row in cursor.fetchall()}
+
+def get_comments_by_requests(request_ids: List[int]) -> Dict[int, List[Dict]]:
+    """Комментарии по нескольким заявкам одним запросом, сгруппированные по заявке"""
+    grouped = {request_id: [] for request_id in request_ids}
+    with get_db_cursor() as (cursor, _):
+        cursor.execute(f"""
+            SELECT c.*, u.fio as master_name
+            FROM comments c
+            LEFT JOIN users u ON c.master_id = u.user_id
+            WHERE c.request_id IN ({', '.join('?' * len(grouped))})
+            ORDER BY c.request_id, c.created_at DESC
+        """, list(grouped))
+        for row in cursor.fetchall():
+            grouped[row["request_id"]].append(dict(row))
+    return grouped
+
+def _insert_comment(message: str, master_id: int, request_id: int) -> Tuple[int, Optional[Dict]]:
+    with get_db_cursor() as (cursor, _):
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         cursor.execute("""
             INSERT INTO comments (message, master_id, request_id, created_at)
             VALUES (?, ?, ?, ?)
         """, (message, master_id, request_id, created_at))
-        conn.commit()
-        return cursor.lastrowid
+        comment_id = cursor.lastrowid
+        # Заказчик и исполнитель заявки - получатели уведомления
+        cursor.execute(
+            "SELECT request_id, client_id, master_id, request_status FROM requests WHERE request_id = ?",
+            (request_id,)
+        )
+        row = cursor.fetchone()
+        return comment_id, dict(row) if row else None
+
+def create_comment(message: str, master_id: int, request_id: int) -> int:
+    """Создать комментарий"""
+    comment_id, row = run_write(_insert_comment, message, master_id, request_id)
+    if row is not None:
+        publish_request_event(events.COMMENT_CREATED, row, comment_id=comment_id, author_id=master_id)
+    return comment_id
 
 # ---------- СТАТИСТИКА ----------
 
+COMPLETED_STATUSES = ("Готова к выдаче", "Завершена")
+
+STATS_CACHE_TTL_SECONDS = 5
+STATS_CACHE_STALE_SECONDS = 60
+# Значения привязаны к версии данных: ответ /stats/all совпадает с версией в его ETag
+statistics_cache = TTLCache(STATS_CACHE_TTL_SECONDS, STATS_CACHE_STALE_SECONDS, version=get_data_version)
+
 def get_completed_requests_count() -> int:
-    """Получить количество выполненных заявок"""
+    """Получить количество выполненных заявок (из счетчиков по статусам)"""
     with get_db_cursor() as (cursor, _):
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM requests 
-            WHERE request_status IN ('Готова к выдаче', 'Завершена')
-        """)
+        cursor.execute(f"""
+            SELECT IFNULL(SUM(cnt), 0) as count
+            FROM stats_status_counts
+            WHERE request_status IN ({', '.join('?' * len(COMPLETED_STATUSES))})
+        """, COMPLETED_STATUSES)
         result = cursor.fetchone()
         return result["count"]
 
 def get_average_completion_time_days() -> Optional[float]:
-    """Получить среднее время выполнения заявки в днях"""
+    """Получить среднее время выполнения заявки в днях (из счетчика длительностей)"""
     with get_db_cursor() as (cursor, _):
         cursor.execute("""
-            SELECT 
-                AVG(
-                    julianday(completion_date) - julianday(start_date)
-                ) as avg_days
-            FROM requests 
-            WHERE completion_date IS NOT NULL 
-            AND completion_date != ''
+            SELECT total_days / cnt as avg_days
+            FROM stats_completion
+            WHERE id = 1 AND cnt > 0
         """)
         result = cursor.fetchone()
-        return result["avg_days"] if result["avg_days"] else None
+        return result["avg_days"] if result and result["avg_days"] else None
+
+def get_status_counts(filters: Optional[Dict] = None) -> Dict[str, int]:
+    """Количество заявок по статусам с фильтрами.
+
+    Без фильтров - из счетчиков по статусам; только с периодом - поиском
+    по индексу (статус, дата) для каждого статуса; иначе - GROUP BY.
+    """
+    filters = {key: value for key, value in (filters or {}).items() if value is not None}
+    with get_db_cursor() as (cursor, _):
+        if not filters:
+            cursor.execute("SELECT request_status, cnt FROM stats_status_counts WHERE cnt > 0")
+        elif set(filters) <= {"date_from", "date_to"}:
+            cursor.execute("""
+                SELECT s.request_status,
+                       (SELECT COUNT(*) FROM requests r
+                        WHERE r.request_status = s.request_status
+                          AND r.start_date >= IFNULL(?1, '') AND r.start_date <= IFNULL(?2, '9999')) as cnt
+                FROM stats_status_counts s
+                WHERE s.cnt > 0
+            """, (filters.get("date_from"), filters.get("date_to")))
+        else:
+            conditions, params = build_request_filters(filters)
+            cursor.execute(f"""
+                SELECT request_status, COUNT(*) as cnt FROM requests
+                WHERE {' AND '.join(conditions)}
+                GROUP BY request_status
+            """, params)
+        return {row["request_status"]: row["cnt"] for row in cursor.fetchall() if row["cnt"]}
 
 def get_problem_statistics() -> List[Dict]:
-    """Получить статистику по типам неисправностей"""
+    """Получить статистику по типам неисправностей (из счетчиков по категориям)"""
     with get_db_cursor() as (cursor, _):
         cursor.execute("""
-            SELECT 
-                problem_description as problem_type,
-                COUNT(*) as cnt
-            FROM requests 
-            GROUP BY problem_description
-            ORDER BY cnt DESC
+            SELECT
+                pc.title as problem_type,
+                s.cnt
+            FROM stats_category_counts s
+            LEFT JOIN problem_categories pc ON pc.category_id = s.category_id
+            ORDER BY s.cnt DESC
         """)
         return [dict(row) for row in cursor.fetchall()]
 
+def get_all_statistics() -> Dict:
+    """Вся статистика одним запросом по таблицам счетчиков"""
+    with get_db_cursor() as (cursor, _):
+        cursor.execute(f"""
+            SELECT
+                (SELECT IFNULL(SUM(cnt), 0) FROM stats_status_counts
+                 WHERE request_status IN ({', '.join('?' * len(COMPLETED_STATUSES))})) as completed_requests_count,
+                (SELECT total_days / cnt FROM stats_completion
+                 WHERE id = 1 AND cnt > 0) as average_completion_time_days,
+                (SELECT json_group_array(json_object('problem_type', problem_type, 'cnt', cnt))
+                 FROM (SELECT pc.title as problem_type, s.cnt
+                       FROM stats_category_counts s
+                       LEFT JOIN problem_categories pc ON pc.category_id = s.category_id
+                       ORDER BY s.cnt DESC)) as problem_statistics
+        """, COMPLETED_STATUSES)
+        row = cursor.fetchone()
+        return {
+            "completed_requests_count": row["completed_requests_count"],
+            "average_completion_time_days": row["average_completion_time_days"] or None,
+            "problem_statistics": json.loads(row["problem_statistics"])
+        }
+
+def get_all_statistics_cached() -> Dict:
+    """Вся статистика из кэша (TTL + фоновое обновление устаревшего значения)"""
+    return statistics_cache.get("all", get_all_statistics)
+
+def invalidate_statistics():
+    """Сбросить кэш статистики после изменения заявок.
+
+    Изменения других воркеров кэш замечает по версии данных сам;
+    сброс нужен для фонового обновления, начатого до изменения.
+    """
+    statistics_cache.clear()
+
+def get_user_statistics(filters: Dict) -> Dict:
+    """Статистика по заявкам с фильтрами (клиента, специалиста или всем) одним запросом.
+
+    Итоги, выполненные, эффективность, среднее время выполнения и
+    разбивки по статусам, типам оборудования и дням выполнения.
+    """
+    conditions, params = build_request_filters(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    completed_placeholders = ", ".join("?" * len(COMPLETED_STATUSES))
+
+    with get_db_cursor() as (cursor, _):
+        # Один проход по requests: группы (статус, тип, дни выполнения) материализуются,
+        # итоги и разбивки считаются по ним. Дата выполнения раньше даты заявки
+        # (ошибка ввода) не учитывается ни в среднем, ни в разбивке по дням
+        cursor.execute(f"""
+            WITH grouped AS MATERIALIZED (
+                SELECT request_status, climate_tech_type, completion_days, COUNT(*) as cnt
+                FROM (
+                    SELECT request_status, climate_tech_type,
+                           CASE WHEN completion_date != '' AND completion_date >= start_date
+                                THEN julianday(completion_date) - julianday(start_date) END as completion_days
+                    FROM requests {where}
+                )
+                GROUP BY request_status, climate_tech_type, completion_days
+            )
+            SELECT
+                totals.total,
+                totals.completed,
+                ROUND(100.0 * totals.completed / NULLIF(totals.total, 0), 1) as efficiency,
+                totals.average_completion_days,
+                (SELECT json_group_object(request_status, cnt) FROM (
+                    SELECT request_status, SUM(cnt) as cnt FROM grouped GROUP BY request_status
+                )) as status_counts,
+                (SELECT json_group_object(climate_tech_type, cnt) FROM (
+                    SELECT climate_tech_type, SUM(cnt) as cnt FROM grouped GROUP BY climate_tech_type
+                )) as tech_type_counts,
+                (SELECT json_group_object(days, cnt) FROM (
+                    SELECT CAST(completion_days AS INTEGER) as days, SUM(cnt) as cnt
+                    FROM grouped WHERE completion_days IS NOT NULL
+                    GROUP BY days
+                )) as completion_days_counts
+            FROM (
+                SELECT
+                    IFNULL(SUM(cnt), 0) as total,
+                    IFNULL(SUM(CASE WHEN request_status IN ({completed_placeholders}) THEN cnt END), 0) as completed,
+                    SUM(completion_days * cnt) / SUM(CASE WHEN completion_days IS NOT NULL THEN cnt END)
+                        as average_completion_days
+                FROM grouped
+            ) as totals
+        """, params + list(COMPLETED_STATUSES))
+        row = cursor.fetchone()
+        return {
+            "total": row["total"],
+            "completed": row["completed"],
+            "efficiency": row["efficiency"] or 0.0,
+            "average_completion_days": row["average_completion_days"],
+            "status_counts": json.loads(row["status_counts"]),
+            "tech_type_counts": json.loads(row["tech_type_counts"]),
+            "completion_days_counts": {int(days): cnt for days, cnt in json.loads(row["completion_days_counts"]).items()},
+        }
+
+def get_specialists_statistics() -> List[Dict]:
+    """Статистика по всем специалистам (из счетчиков по специалистам и статусам)"""
+    with get_db_cursor() as (cursor, _):
+        cursor.execute(f"""
+            SELECT
+                u.user_id,
+                u.fio,
+                IFNULL(SUM(s.cnt), 0) as total,
+                IFNULL(SUM(CASE WHEN s.request_status IN ({', '.join('?' * len(COMPLETED_STATUSES))})
+                           THEN s.cnt END), 0) as completed,
+                SUM(s.total_days) / NULLIF(SUM(s.days_cnt), 0) as average_completion_days,
+                json_group_object(IFNULL(s.request_status, ''), s.cnt) as status_counts
+            FROM users u
+            LEFT JOIN stats_master_status_counts s ON s.master_id = u.user_id
+            WHERE u.role = 'Специалист'
+            GROUP BY u.user_id
+            ORDER BY u.fio
+        """, COMPLETED_STATUSES)
+        result = []
+        for row in cursor.fetchall():
+            item = dict(row)
+            status_counts = json.loads(item["status_counts"])
+            status_counts.pop("", None)  # специалист без заявок
+            item["status_counts"] = status_counts
+            item["efficiency"] = round(100.0 * item["completed"] / item["total"], 1) if item["total"] else 0.0
+            result.append(item)
+        return result
+
+STATISTICS_SOURCE_QUERIES = {
+    "stats_status_counts": """
+        SELECT request_status, COUNT(*) FROM requests
+        GROUP BY request_status
+    """,
+    "stats_category_counts": """
+        SELECT IFNULL(problem_category_id, 0), COUNT(*) FROM requests
+        GROUP BY IFNULL(problem_category_id, 0)
+    """,
+    "stats_master_status_counts": """
+        SELECT master_id, request_status, COUNT(*), IFNULL(SUM(days), 0), COUNT(days) FROM (
+            SELECT master_id, request_status,
+                   CASE WHEN completion_date != '' AND completion_date >= start_date
+                        THEN julianday(completion_date) - julianday(start_date) END AS days
+            FROM requests
+            WHERE master_id IS NOT NULL
+        )
+        GROUP BY master_id, request_status
+    """,
+    "stats_completion": """
+        SELECT 1, IFNULL(SUM(days), 0), COUNT(days) FROM (
+            SELECT julianday(completion_date) - julianday(start_date) AS days
+            FROM requests
+            WHERE completion_date != '' AND completion_date >= start_date
+        )
+    """,
+}
+
+# Число ключевых колонок в начале строки счетчика (по умолчанию одна)
+STATISTICS_KEY_COLUMNS = {"stats_master_status_counts": 2}
+
+def rebuild_statistics(repair: bool = True) -> Dict[str, int]:
+    """Пересчитать счетчики статистики по таблице requests.
+
+    Возвращает количество расхождений по каждой таблице счетчиков;
+    при repair=True счетчики заменяются пересчитанными значениями.
+    """
+    drift = {}
+    with get_db_cursor() as (cursor, conn):
+        # BEGIN IMMEDIATE - пересчет и замена без параллельных записей
+        cursor.execute("BEGIN IMMEDIATE")
+        for table, query in STATISTICS_SOURCE_QUERIES.items():
+            k = STATISTICS_KEY_COLUMNS.get(table, 1)
+            expected = {tuple(row[:k]): tuple(row[k:]) for row in cursor.execute(query).fetchall()}
+            cursor.execute(f"SELECT * FROM {table}")
+            placeholders = ", ".join("?" * len(cursor.description))
+            actual = {tuple(row[:k]): tuple(row[k:]) for row in cursor.fetchall()}
+
+            mismatched = set(expected) ^ set(actual)
+            for key in set(expected) & set(actual):
+                if any(abs(e - a) > 1e-6 for e, a in zip(expected[key], actual[key])):
+                    mismatched.add(key)
+            drift[table] = len(mismatched)
+
+            if repair and mismatched:
+                cursor.execute(f"DELETE FROM {table}")
+                cursor.executemany(
+                    f"INSERT INTO {table} VALUES ({placeholders})",
+                    [key + values for key, values in expected.items()]
+                )
+        conn.commit()
+    if repair:
+        invalidate_statistics()
+    return drift
+
+def backfill_problem_categories() -> int:
+    """Проставить категории неисправностей заявкам, у которых их нет"""
+    with get_db_cursor() as (_, conn):
+        updated = problem_categories.backfill_categories(conn)
+        conn.commit()
+    if updated:
+        invalidate_statistics()
+    return updated
+
 def get_users_by_role(role: str) -> List[Dict]:
     """Получить пользователей по роли"""
     with get_db_cursor() as (cursor, _):
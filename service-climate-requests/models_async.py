@@ -0,0 +1,71 @@
+"""Асинхронный вариант API models.py.
+
+Каждая функция выполняет одноименную функцию models в пуле потоков БД
+(database.run_in_db_executor), поэтому медленный запрос к SQLite не
+блокирует цикл событий и остальные запросы воркера.
+"""
+import functools
+from typing import Dict, Optional
+
+import models
+from database import run_in_db_executor
+
+
+def _in_db_executor(func):
+    """Асинхронная обертка над блокирующей функцией models"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_executor(func, *args, **kwargs)
+    return wrapper
+
+# ---------- ПОЛЬЗОВАТЕЛИ ----------
+
+get_user_by_login = _in_db_executor(models.get_user_by_login)
+get_user_by_id = _in_db_executor(models.get_user_by_id)
+create_user = _in_db_executor(models.create_user)
+update_user_password = _in_db_executor(models.update_user_password)
+is_login_taken = _in_db_executor(models.is_login_taken)
+get_existing_user_ids = _in_db_executor(models.get_existing_user_ids)
+get_users_by_role = _in_db_executor(models.get_users_by_role)
+get_all_specialists = _in_db_executor(models.get_all_specialists)
+
+async def get_cached_user(user_id: int) -> Optional[Dict]:
+    """Получить пользователя из кэша без переключения потока, при промахе - из БД"""
+    user = models.user_cache.get(user_id)
+    if user is None:
+        user = await run_in_db_executor(models.get_cached_user, user_id)
+    return user
+
+# ---------- ЗАЯВКИ ----------
+
+get_all_requests = _in_db_executor(models.get_all_requests)
+get_requests_page_rows = _in_db_executor(models.get_requests_page_rows)
+get_request_by_id = _in_db_executor(models.get_request_by_id)
+create_request = _in_db_executor(models.create_request)
+create_requests = _in_db_executor(models.create_requests)
+update_request = _in_db_executor(models.update_request)
+bulk_update_requests = _in_db_executor(models.bulk_update_requests)
+delete_request = _in_db_executor(models.delete_request)
+get_requests_by_client = _in_db_executor(models.get_requests_by_client)
+get_requests_by_master = _in_db_executor(models.get_requests_by_master)
+search_requests = _in_db_executor(models.search_requests)
+
+# ---------- КОММЕНТАРИИ ----------
+
+get_comments_by_request = _in_db_executor(models.get_comments_by_request)
+get_requests_access = _in_db_executor(models.get_requests_access)
+get_comments_by_requests = _in_db_executor(models.get_comments_by_requests)
+create_comment = _in_db_executor(models.create_comment)
+
+# ---------- СТАТИСТИКА ----------
+
+get_completed_requests_count = _in_db_executor(models.get_completed_requests_count)
+get_average_completion_time_days = _in_db_executor(models.get_average_completion_time_days)
+get_status_counts = _in_db_executor(models.get_status_counts)
+get_problem_statistics = _in_db_executor(models.get_problem_statistics)
+get_all_statistics = _in_db_executor(models.get_all_statistics)
+get_all_statistics_cached = _in_db_executor(models.get_all_statistics_cached)
+get_user_statistics = _in_db_executor(models.get_user_statistics)
+get_specialists_statistics = _in_db_executor(models.get_specialists_statistics)
+rebuild_statistics = _in_db_executor(models.rebuild_statistics)
+backfill_problem_categories = _in_db_executor(models.backfill_problem_categories)
@@ -0,0 +1,84 @@
+"""Хэширование и проверка паролей (bcrypt через passlib).
+
+bcrypt намеренно медленный (десятки миллисекунд CPU на вызов), поэтому
+асинхронные функции выполняют его в ограниченном пуле потоков: bcrypt
+отпускает GIL, и цикл событий продолжает обслуживать другие запросы.
+
+Пароли, сохраненные открытым текстом (старые записи и импорт из CSV),
+принимаются при входе и сразу перехэшируются - так же, как хэши с
+устаревшим числом раундов.
+"""
+import asyncio
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Стоимость bcrypt (2^rounds итераций) и размер пула, переопределяются окружением
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def hash_password(password: str) -> str:
+    """Хэш пароля для хранения в users.password"""
+    return pwd_context.hash(password)
+
+
+def is_password_hash(stored: str) -> bool:
+    """Является ли сохраненное значение хэшем (а не открытым текстом)"""
+    return pwd_context.identify(stored) is not None
+
+
+def verify_password(password: str, stored: str) -> Tuple[bool, Optional[str]]:
+    """Проверить пароль.
+
+    Возвращает (совпадает ли пароль, новый хэш или None). Новый хэш
+    возвращается, если запись нужно обновить: пароль хранился открытым
+    текстом или хэширован с другими параметрами.
+    """
+    if not stored:
+        return False, None
+    if not is_password_hash(stored):
+        if hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")):
+            return True, hash_password(password)
+        return False, None
+    return pwd_context.verify_and_update(password, stored)
+
+# ---------- ПУЛ ПОТОКОВ ----------
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    """Пул потоков для bcrypt (PASSWORD_HASH_WORKERS потоков)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+        return _executor
+
+
+def shutdown_hash_executor():
+    """Остановить пул потоков (при остановке приложения или смене размера)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password в пуле потоков bcrypt"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), hash_password, password)
+
+
+async def verify_password_async(password: str, stored: str) -> Tuple[bool, Optional[str]]:
+    """verify_password в пуле потоков bcrypt"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), verify_password, password, stored)
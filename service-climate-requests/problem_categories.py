@@ -0,0 +1,237 @@
+"""Категории неисправностей для статистики.
+
+Свободный текст problem_description нормализуется (регистр, ё, знаки
+препинания, пробелы, отсечение русских окончаний), после чего близкие
+варианты объединяются в одну категорию по сходству Жаккара на
+триграммах. Каждой заявке проставляется компактный problem_category_id,
+статистика считается по нему.
+
+Категоризация инкрементальная: новая формулировка сравнивается только
+с уже известными категориями через инвертированный индекс триграмм,
+история заново не кластеризуется. Тексты с разными отрицаниями ("течет
+вода" / "не течет вода") не объединяются, а короткая категория принимает
+только почти дословные варианты: лишнее слово ("не работает пульт")
+сужает ее смысл.
+"""
+import re
+import sqlite3
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+# Минимальное сходство триграмм, при котором текст попадает в категорию
+SIMILARITY_THRESHOLD = 0.5
+# Порог для категорий не длиннее SHORT_PHRASE_WORDS слов
+SHORT_PHRASE_WORDS = 2
+SHORT_PHRASE_THRESHOLD = 0.7
+
+# Отрицания должны совпадать, чтобы тексты попали в одну категорию
+NEGATION_WORDS = frozenset(("не", "нет"))
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Окончания для отсечения (от длинных к коротким), основа - не короче MIN_STEM_LENGTH
+RUSSIAN_ENDINGS = tuple(sorted((
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ает", "яет", "ует", "ают", "яют", "уют", "ать", "ять", "ить", "еть",
+    "ешь", "ишь", "ем", "им", "ете", "ите", "ала", "ило", "или",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ей", "ов", "ев",
+    "ам", "ям", "ах", "ях", "ом", "ую", "юю", "ет", "ит", "ут", "ют", "ат", "ят",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+), key=len, reverse=True))
+REFLEXIVE_ENDINGS = ("ся", "сь")
+MIN_STEM_LENGTH = 3
+
+
+def stem_word(word: str) -> str:
+    """Облегченный стемминг русского слова (отсечение окончания)"""
+    for ending in REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            word = word[:-len(ending)]
+            break
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def normalize_problem(text: Optional[str]) -> str:
+    """Нормализованная форма описания: основы слов через пробел"""
+    if not text:
+        return ""
+    words = WORD_RE.findall(text.lower().replace("ё", "е"))
+    return " ".join(stem_word(word) for word in words)
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Множество триграмм нормализованной строки (с границами слов)"""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def negations(normalized: str) -> Tuple[str, ...]:
+    """Отрицания нормализованной строки по порядку"""
+    return tuple(word for word in normalized.split() if word in NEGATION_WORDS)
+
+
+def category_threshold(normalized: str) -> float:
+    """Минимальное сходство текста с категорией (для коротких категорий - выше)"""
+    if len(normalized.split()) <= SHORT_PHRASE_WORDS:
+        return SHORT_PHRASE_THRESHOLD
+    return SIMILARITY_THRESHOLD
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Сходство Жаккара двух множеств"""
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+class CategoryIndex:
+    """Инвертированный индекс триграмм нормализованных названий категорий"""
+
+    def __init__(self):
+        self.trigrams: Dict[int, Set[str]] = {}  # category_id -> триграммы
+        self.postings: Dict[str, Set[int]] = {}  # триграмма -> category_id
+        self.negations: Dict[int, Tuple[str, ...]] = {}  # category_id -> отрицания
+        self.thresholds: Dict[int, float] = {}  # category_id -> порог сходства
+        self.max_category_id = 0
+
+    def add(self, category_id: int, normalized: str):
+        grams = trigrams(normalized)
+        self.trigrams[category_id] = grams
+        self.negations[category_id] = negations(normalized)
+        self.thresholds[category_id] = category_threshold(normalized)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(category_id)
+        self.max_category_id = max(self.max_category_id, category_id)
+
+    def match(self, normalized: str) -> Optional[int]:
+        """Самая похожая категория с теми же отрицаниями не ниже ее порога (или None).
+
+        >>> index = CategoryIndex()
+        >>> index.add(1, normalize_problem("Не охлаждает воздух"))
+        >>> index.add(2, normalize_problem("Течет вода"))
+        >>> index.add(3, normalize_problem("Не работает"))
+        >>> index.match(normalize_problem("не охлаждает"))
+        1
+        >>> index.match(normalize_problem("Не течет вода")) is None
+        True
+        >>> index.match(normalize_problem("Не работает пульт")) is None
+        True
+        >>> index.match(normalize_problem("Не работает!"))
+        3
+        """
+        grams = trigrams(normalized)
+        text_negations = negations(normalized)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.postings.get(gram, set())
+        best_id, best_score = None, 0.0
+        for category_id in sorted(candidates):
+            if self.negations[category_id] != text_negations:
+                continue
+            score = jaccard(grams, self.trigrams[category_id])
+            if score >= self.thresholds[category_id] and (best_id is None or score > best_score):
+                best_id, best_score = category_id, score
+        return best_id
+
+
+_indexes: Dict[str, CategoryIndex] = {}  # файл БД -> индекс
+_index_lock = threading.Lock()
+
+
+def get_index(conn: sqlite3.Connection) -> CategoryIndex:
+    """Индекс категорий БД; догружает категории, созданные другими воркерами"""
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    with _index_lock:
+        index = _indexes.setdefault(path, CategoryIndex())
+        rows = conn.execute(
+            "SELECT category_id, normalized FROM problem_categories WHERE category_id > ? ORDER BY category_id",
+            (index.max_category_id,)
+        ).fetchall()
+        for category_id, normalized in rows:
+            index.add(category_id, normalized)
+        return index
+
+
+def reset_index():
+    """Сбросить индексы (после отката транзакции, создававшей категории)"""
+    with _index_lock:
+        _indexes.clear()
+
+
+def categorize(conn: sqlite3.Connection, text: Optional[str]) -> Optional[int]:
+    """ID категории для описания проблемы (при необходимости создает категорию).
+
+    Выполняется в транзакции вызывающего кода; None - описание пустое.
+    """
+    normalized = normalize_problem(text)
+    if not normalized:
+        return None
+
+    row = conn.execute(
+        "SELECT category_id FROM problem_category_aliases WHERE normalized = ?", (normalized,)
+    ).fetchone()
+    if row:
+        return row[0]
+
+    index = get_index(conn)
+    category_id = index.match(normalized)
+    if category_id is None:
+        # OR IGNORE: ту же категорию мог только что создать другой воркер
+        conn.execute(
+            "INSERT OR IGNORE INTO problem_categories (title, normalized) VALUES (?, ?)",
+            (" ".join(text.split()), normalized)
+        )
+        category_id = conn.execute(
+            "SELECT category_id FROM problem_categories WHERE normalized = ?", (normalized,)
+        ).fetchone()[0]
+        # Индекс процесса дополняется при следующем get_index
+    conn.execute(
+        "INSERT OR IGNORE INTO problem_category_aliases (normalized, category_id) VALUES (?, ?)",
+        (normalized, category_id)
+    )
+    return category_id
+
+
+def backfill_categories(conn: sqlite3.Connection) -> int:
+    """Проставить категории заявкам без категории, вернуть число обновленных.
+
+    Каждое различное описание категоризируется один раз, затем заявки
+    обновляются одним UPDATE ... FROM.
+    """
+    descriptions = [row[0] for row in conn.execute("""
+        SELECT DISTINCT problem_description FROM requests
+        WHERE problem_category_id IS NULL AND problem_description != ''
+    """)]
+    if not descriptions:
+        return 0
+
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS category_backfill (
+            problem_description TEXT PRIMARY KEY,
+            category_id INTEGER NOT NULL
+        )
+    """)
+    conn.execute("DELETE FROM temp.category_backfill")
+    try:
+        for description in descriptions:
+            category_id = categorize(conn, description)
+            if category_id is not None:
+                conn.execute(
+                    "INSERT INTO temp.category_backfill VALUES (?, ?)", (description, category_id)
+                )
+    except Exception:
+        # Категории из этой транзакции могут не сохраниться - индекс перечитаем
+        reset_index()
+        raise
+    updated = conn.execute("""
+        UPDATE requests SET problem_category_id = b.category_id
+        FROM temp.category_backfill AS b
+        WHERE requests.problem_description = b.problem_description
+          AND requests.problem_category_id IS NULL
+    """).rowcount
+    conn.execute("DROP TABLE temp.category_backfill")
+    return updated
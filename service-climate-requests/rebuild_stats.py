@@ -0,0 +1,38 @@
+# rebuild_stats.py
+"""Проверка и восстановление счетчиков статистики (stats_*).
+
+    python rebuild_stats.py          # пересчитать и исправить расхождения
+    python rebuild_stats.py --check  # только проверить (код выхода 1 при расхождениях)
+"""
+import argparse
+import sys
+
+import database
+import models
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка и пересчет счетчиков статистики")
+    parser.add_argument("--db", default=database.DATABASE_PATH, help="путь к файлу БД")
+    parser.add_argument("--check", action="store_true", help="только проверить, ничего не менять")
+    args = parser.parse_args(argv)
+
+    database.DATABASE_PATH = args.db
+    database.init_db()
+    if not args.check:
+        categorized = models.backfill_problem_categories()
+        if categorized:
+            print(f"Категории проставлены заявкам: {categorized}")
+    drift = models.rebuild_statistics(repair=not args.check)
+
+    for table, mismatched in drift.items():
+        print(f"{table}: расхождений {mismatched}")
+    if any(drift.values()):
+        print("Проверка: найдены расхождения" if args.check else "Счетчики пересчитаны")
+        return 1 if args.check else 0
+    print("Счетчики в порядке")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
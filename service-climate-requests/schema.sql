@@ -9,6 +9,19 @@ CREATE TABLE IF NOT EXISTS users (
   role TEXT NOT NULL -- Менеджер, Специалист, Оператор, Заказчик
 );
 
+-- Категории неисправностей (см. problem_categories.py)
+CREATE TABLE IF NOT EXISTS problem_categories (
+  category_id INTEGER PRIMARY KEY,
+  title TEXT NOT NULL,            -- первая встреченная формулировка
+  normalized TEXT NOT NULL UNIQUE -- нормализованная форма для сравнения
+);
+
+-- Нормализованные формулировки, уже отнесенные к категории
+CREATE TABLE IF NOT EXISTS problem_category_aliases (
+  normalized TEXT PRIMARY KEY,
+  category_id INTEGER NOT NULL REFERENCES problem_categories(category_id)
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS requests (
   request_id INTEGER PRIMARY KEY,
   start_date TEXT NOT NULL,
@@ -20,6 +33,8 @@ CREATE TABLE IF NOT EXISTS requests (
   repair_parts TEXT,
   master_id INTEGER,
   client_id INTEGER NOT NULL,
+  problem_category_id INTEGER, -- проставляется при создании/изменении (problem_categories.py)
+  FOREIGN KEY(problem_category_id) REFERENCES problem_categories(category_id) ON DELETE SET NULL,
   FOREIGN KEY(master_id) REFERENCES users(user_id) ON DELETE SET NULL,
   FOREIGN KEY(client_id) REFERENCES users(user_id) ON DELETE RESTRICT
 );
@@ -37,3 +52,275 @@ CREATE TABLE IF NOT EXISTS comments (
 CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(request_status);
 CREATE INDEX IF NOT EXISTS idx_requests_client ON requests(client_id);
 CREATE INDEX IF NOT EXISTS idx_requests_master ON requests(master_id);
+CREATE INDEX IF NOT EXISTS idx_requests_problem_category ON requests(problem_category_id);
+
+-- Комментарии по заявке, новые первыми (без отдельной сортировки)
+CREATE INDEX IF NOT EXISTS idx_comments_request_created ON comments(request_id, created_at DESC);
+
+-- Постраничная выдача заявок: порядок (start_date DESC, request_id DESC)
+CREATE INDEX IF NOT EXISTS idx_requests_start_date ON requests(start_date DESC, request_id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_status_date ON requests(request_status, start_date DESC, request_id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_type_date ON requests(climate_tech_type, start_date DESC, request_id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_client_date ON requests(client_id, start_date DESC, request_id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_master_date ON requests(master_id, start_date DESC, request_id DESC);
+
+-- Счетчики для /stats/*, поддерживаются триггерами на requests
+BEGIN IMMEDIATE;
+
+CREATE TABLE IF NOT EXISTS stats_status_counts (
+  request_status TEXT PRIMARY KEY,
+  cnt INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stats_category_counts (
+  category_id INTEGER PRIMARY KEY, -- 0 для заявок без категории
+  cnt INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stats_completion (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  total_days REAL NOT NULL DEFAULT 0, -- сумма (completion_date - start_date) в днях
+  cnt INTEGER NOT NULL DEFAULT 0
+);
+
+-- Время выполнения учитывается только при completion_date >= start_date:
+-- счетчик, накопленный триггерами без этого условия, пересчитывается,
+-- триггеры пересоздаются
+UPDATE stats_completion
+   SET (total_days, cnt) = (
+     SELECT IFNULL(SUM(julianday(completion_date) - julianday(start_date)), 0),
+            COUNT(julianday(completion_date) - julianday(start_date))
+     FROM requests
+     WHERE completion_date != '' AND completion_date >= start_date
+   )
+ WHERE EXISTS (SELECT 1 FROM sqlite_master
+               WHERE type = 'trigger' AND name = 'trg_requests_counts_insert'
+                 AND sql NOT LIKE '%NEW.completion_date >= NEW.start_date%');
+DROP TRIGGER IF EXISTS trg_requests_counts_insert;
+DROP TRIGGER IF EXISTS trg_requests_counts_delete;
+DROP TRIGGER IF EXISTS trg_requests_counts_update;
+
+-- Счетчики по сырому тексту заменены счетчиками по категориям
+DROP TABLE IF EXISTS stats_problem_counts;
+DROP TRIGGER IF EXISTS trg_requests_stats_insert;
+DROP TRIGGER IF EXISTS trg_requests_stats_delete;
+DROP TRIGGER IF EXISTS trg_requests_stats_update;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_counts_insert AFTER INSERT ON requests
+BEGIN
+  INSERT INTO stats_status_counts (request_status, cnt) VALUES (NEW.request_status, 1)
+    ON CONFLICT(request_status) DO UPDATE SET cnt = cnt + 1;
+  INSERT INTO stats_category_counts (category_id, cnt) VALUES (IFNULL(NEW.problem_category_id, 0), 1)
+    ON CONFLICT(category_id) DO UPDATE SET cnt = cnt + 1;
+  UPDATE stats_completion
+     SET total_days = total_days + (julianday(NEW.completion_date) - julianday(NEW.start_date)),
+         cnt = cnt + 1
+   WHERE id = 1
+     AND NEW.completion_date != '' AND NEW.completion_date >= NEW.start_date
+     AND julianday(NEW.completion_date) - julianday(NEW.start_date) IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_counts_delete AFTER DELETE ON requests
+BEGIN
+  UPDATE stats_status_counts SET cnt = cnt - 1 WHERE request_status = OLD.request_status;
+  DELETE FROM stats_status_counts WHERE request_status = OLD.request_status AND cnt <= 0;
+  UPDATE stats_category_counts SET cnt = cnt - 1 WHERE category_id = IFNULL(OLD.problem_category_id, 0);
+  DELETE FROM stats_category_counts WHERE category_id = IFNULL(OLD.problem_category_id, 0) AND cnt <= 0;
+  UPDATE stats_completion
+     SET total_days = total_days - (julianday(OLD.completion_date) - julianday(OLD.start_date)),
+         cnt = cnt - 1
+   WHERE id = 1
+     AND OLD.completion_date != '' AND OLD.completion_date >= OLD.start_date
+     AND julianday(OLD.completion_date) - julianday(OLD.start_date) IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_counts_update
+AFTER UPDATE OF request_status, problem_category_id, start_date, completion_date ON requests
+BEGIN
+  UPDATE stats_status_counts SET cnt = cnt - 1 WHERE request_status = OLD.request_status;
+  DELETE FROM stats_status_counts WHERE request_status = OLD.request_status AND cnt <= 0;
+  INSERT INTO stats_status_counts (request_status, cnt) VALUES (NEW.request_status, 1)
+    ON CONFLICT(request_status) DO UPDATE SET cnt = cnt + 1;
+
+  UPDATE stats_category_counts SET cnt = cnt - 1 WHERE category_id = IFNULL(OLD.problem_category_id, 0);
+  DELETE FROM stats_category_counts WHERE category_id = IFNULL(OLD.problem_category_id, 0) AND cnt <= 0;
+  INSERT INTO stats_category_counts (category_id, cnt) VALUES (IFNULL(NEW.problem_category_id, 0), 1)
+    ON CONFLICT(category_id) DO UPDATE SET cnt = cnt + 1;
+
+  UPDATE stats_completion
+     SET total_days = total_days - (julianday(OLD.completion_date) - julianday(OLD.start_date)),
+         cnt = cnt - 1
+   WHERE id = 1
+     AND OLD.completion_date != '' AND OLD.completion_date >= OLD.start_date
+     AND julianday(OLD.completion_date) - julianday(OLD.start_date) IS NOT NULL;
+  UPDATE stats_completion
+     SET total_days = total_days + (julianday(NEW.completion_date) - julianday(NEW.start_date)),
+         cnt = cnt + 1
+   WHERE id = 1
+     AND NEW.completion_date != '' AND NEW.completion_date >= NEW.start_date
+     AND julianday(NEW.completion_date) - julianday(NEW.start_date) IS NOT NULL;
+END;
+
+-- Счетчики по специалистам: заявки по статусам и суммарное время выполнения
+CREATE TABLE IF NOT EXISTS stats_master_status_counts (
+  master_id INTEGER NOT NULL,
+  request_status TEXT NOT NULL,
+  cnt INTEGER NOT NULL DEFAULT 0,
+  total_days REAL NOT NULL DEFAULT 0, -- сумма (completion_date - start_date) в днях
+  days_cnt INTEGER NOT NULL DEFAULT 0, -- заявок с датой выполнения
+  PRIMARY KEY (master_id, request_status)
+) WITHOUT ROWID;
+
+-- Счетчики прежних триггеров (без условия completion_date >= start_date)
+-- очищаются и заполняются заново ниже
+DELETE FROM stats_master_status_counts
+ WHERE EXISTS (SELECT 1 FROM sqlite_master
+               WHERE type = 'trigger' AND name = 'trg_requests_master_counts_insert'
+                 AND sql NOT LIKE '%NEW.completion_date >= NEW.start_date%');
+DROP TRIGGER IF EXISTS trg_requests_master_counts_insert;
+DROP TRIGGER IF EXISTS trg_requests_master_counts_delete;
+DROP TRIGGER IF EXISTS trg_requests_master_counts_update;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_master_counts_insert AFTER INSERT ON requests
+WHEN NEW.master_id IS NOT NULL
+BEGIN
+  INSERT INTO stats_master_status_counts (master_id, request_status, cnt, total_days, days_cnt)
+    SELECT NEW.master_id, NEW.request_status, 1, IFNULL(days, 0), days IS NOT NULL
+    FROM (SELECT CASE WHEN NEW.completion_date != '' AND NEW.completion_date >= NEW.start_date
+                 THEN julianday(NEW.completion_date) - julianday(NEW.start_date) END AS days)
+    WHERE true
+    ON CONFLICT(master_id, request_status) DO UPDATE SET
+      cnt = cnt + 1,
+      total_days = total_days + excluded.total_days,
+      days_cnt = days_cnt + excluded.days_cnt;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_master_counts_delete AFTER DELETE ON requests
+WHEN OLD.master_id IS NOT NULL
+BEGIN
+  UPDATE stats_master_status_counts
+     SET cnt = cnt - 1,
+         total_days = total_days - IFNULL(CASE WHEN OLD.completion_date != '' AND OLD.completion_date >= OLD.start_date
+                      THEN julianday(OLD.completion_date) - julianday(OLD.start_date) END, 0),
+         days_cnt = days_cnt - (CASE WHEN OLD.completion_date != '' AND OLD.completion_date >= OLD.start_date
+                    THEN julianday(OLD.completion_date) - julianday(OLD.start_date) END IS NOT NULL)
+   WHERE master_id = OLD.master_id AND request_status = OLD.request_status;
+  DELETE FROM stats_master_status_counts
+   WHERE master_id = OLD.master_id AND request_status = OLD.request_status AND cnt <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_master_counts_update
+AFTER UPDATE OF master_id, request_status, start_date, completion_date ON requests
+BEGIN
+  UPDATE stats_master_status_counts
+     SET cnt = cnt - 1,
+         total_days = total_days - IFNULL(CASE WHEN OLD.completion_date != '' AND OLD.completion_date >= OLD.start_date
+                      THEN julianday(OLD.completion_date) - julianday(OLD.start_date) END, 0),
+         days_cnt = days_cnt - (CASE WHEN OLD.completion_date != '' AND OLD.completion_date >= OLD.start_date
+                    THEN julianday(OLD.completion_date) - julianday(OLD.start_date) END IS NOT NULL)
+   WHERE master_id = OLD.master_id AND request_status = OLD.request_status;
+  DELETE FROM stats_master_status_counts
+   WHERE master_id = OLD.master_id AND request_status = OLD.request_status AND cnt <= 0;
+
+  INSERT INTO stats_master_status_counts (master_id, request_status, cnt, total_days, days_cnt)
+    SELECT NEW.master_id, NEW.request_status, 1, IFNULL(days, 0), days IS NOT NULL
+    FROM (SELECT CASE WHEN NEW.completion_date != '' AND NEW.completion_date >= NEW.start_date
+                 THEN julianday(NEW.completion_date) - julianday(NEW.start_date) END AS days)
+    WHERE NEW.master_id IS NOT NULL
+    ON CONFLICT(master_id, request_status) DO UPDATE SET
+      cnt = cnt + 1,
+      total_days = total_days + excluded.total_days,
+      days_cnt = days_cnt + excluded.days_cnt;
+END;
+
+-- Первичное заполнение счетчиков (только если они еще не заполнены)
+INSERT INTO stats_master_status_counts (master_id, request_status, cnt, total_days, days_cnt)
+  SELECT master_id, request_status, COUNT(*), IFNULL(SUM(days), 0), COUNT(days) FROM (
+    SELECT master_id, request_status,
+           CASE WHEN completion_date != '' AND completion_date >= start_date
+                THEN julianday(completion_date) - julianday(start_date) END AS days
+    FROM requests
+    WHERE master_id IS NOT NULL
+  )
+  WHERE NOT EXISTS (SELECT 1 FROM stats_master_status_counts)
+  GROUP BY master_id, request_status;
+
+INSERT INTO stats_status_counts (request_status, cnt)
+  SELECT request_status, COUNT(*) FROM requests
+  WHERE NOT EXISTS (SELECT 1 FROM stats_completion)
+  GROUP BY request_status;
+
+INSERT INTO stats_category_counts (category_id, cnt)
+  SELECT IFNULL(problem_category_id, 0), COUNT(*) FROM requests
+  WHERE NOT EXISTS (SELECT 1 FROM stats_category_counts)
+  GROUP BY IFNULL(problem_category_id, 0);
+
+INSERT OR IGNORE INTO stats_completion (id, total_days, cnt)
+  SELECT 1, IFNULL(SUM(days), 0), COUNT(days) FROM (
+    SELECT julianday(completion_date) - julianday(start_date) AS days
+    FROM requests
+    WHERE completion_date != '' AND completion_date >= start_date
+  );
+
+COMMIT;
+
+-- Полнотекстовый поиск (FTS5, внешнее содержимое), поддерживается триггерами
+BEGIN IMMEDIATE;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+  problem_description, climate_tech_model,
+  content='requests', content_rowid='request_id',
+  tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+  message,
+  content='comments', content_rowid='comment_id',
+  tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_fts_insert AFTER INSERT ON requests
+BEGIN
+  INSERT INTO requests_fts (rowid, problem_description, climate_tech_model)
+    VALUES (NEW.request_id, NEW.problem_description, NEW.climate_tech_model);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_fts_delete AFTER DELETE ON requests
+BEGIN
+  INSERT INTO requests_fts (requests_fts, rowid, problem_description, climate_tech_model)
+    VALUES ('delete', OLD.request_id, OLD.problem_description, OLD.climate_tech_model);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_fts_update
+AFTER UPDATE OF problem_description, climate_tech_model ON requests
+BEGIN
+  INSERT INTO requests_fts (requests_fts, rowid, problem_description, climate_tech_model)
+    VALUES ('delete', OLD.request_id, OLD.problem_description, OLD.climate_tech_model);
+  INSERT INTO requests_fts (rowid, problem_description, climate_tech_model)
+    VALUES (NEW.request_id, NEW.problem_description, NEW.climate_tech_model);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comments_fts_insert AFTER INSERT ON comments
+BEGIN
+  INSERT INTO comments_fts (rowid, message) VALUES (NEW.comment_id, NEW.message);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comments_fts_delete AFTER DELETE ON comments
+BEGIN
+  INSERT INTO comments_fts (comments_fts, rowid, message) VALUES ('delete', OLD.comment_id, OLD.message);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comments_fts_update AFTER UPDATE OF message ON comments
+BEGIN
+  INSERT INTO comments_fts (comments_fts, rowid, message) VALUES ('delete', OLD.comment_id, OLD.message);
+  INSERT INTO comments_fts (rowid, message) VALUES (NEW.comment_id, NEW.message);
+END;
+
+-- Первичное построение индексов (только если они еще пусты)
+INSERT INTO requests_fts (requests_fts)
+  SELECT 'rebuild' WHERE NOT EXISTS (SELECT 1 FROM requests_fts_docsize);
+
+INSERT INTO comments_fts (comments_fts)
+  SELECT 'rebuild' WHERE NOT EXISTS (SELECT 1 FROM comments_fts_docsize);
+
+COMMIT;
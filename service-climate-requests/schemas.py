@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 class RequestBase(BaseModel):
     start_date: str
@@ -21,6 +21,19 @@ class RequestUpdate(BaseModel):
     completion_date: Optional[str] = None
     repair_parts: Optional[str] = None
 
+class RequestFilter(BaseModel):
+    statuses: Optional[List[str]] = None
+    climate_tech_type: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    master_id: Optional[int] = None
+    client_id: Optional[int] = None
+
+class RequestBulkUpdate(BaseModel):
+    request_ids: Optional[List[int]] = None  # ID заявок и/или фильтр
+    filter: Optional[RequestFilter] = None
+    changes: RequestUpdate
+
 class RequestResponse(BaseModel):
     request_id: int
     start_date: str
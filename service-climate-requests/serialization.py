@@ -0,0 +1,48 @@
+"""Быстрая сериализация больших списков в JSON.
+
+Обработчики, возвращающие тысячи строк, отдают готовый Response:
+FastAPI не прогоняет результат через jsonable_encoder и не копирует
+словари. Кодирование - через orjson, если он установлен, иначе через
+стандартный json.
+
+Табличный формат (columns) передает имена колонок один раз, а строки -
+массивами значений в том же порядке:
+
+    {"columns": ["request_id", "start_date", ...], "rows": [[1, "2024-01-01", ...], ...]}
+"""
+import json
+from typing import Any, Iterable, List, Sequence
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON в UTF-8 (без экранирования не-ASCII символов)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def rows_to_objects(columns: Sequence[str], rows: Iterable[Sequence]) -> List[dict]:
+    """Строки-кортежи -> список словарей {колонка: значение}"""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def columns_payload(columns: Sequence[str], rows: List[Sequence]) -> dict:
+    """Табличный формат: имена колонок и строки-массивы"""
+    return {"columns": list(columns), "rows": rows}
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ, кодируемый через dumps (orjson или json)"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
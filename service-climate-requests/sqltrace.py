@@ -0,0 +1,249 @@
+# sqltrace.py
+"""Трассировка SQL: время каждого запроса, медленные запросы и их планы.
+
+Включается явно (переменная окружения SQL_TRACE=1 или enable()). Тогда
+соединения database.py получают set_trace_callback: для каждого вызова
+execute/executemany/executescript записываются фактически выполненные
+команды (с подставленными параметрами и командами триггеров), время
+выполнения и вызывающая функция (например, models.get_comments_by_request).
+
+Запросы дольше порога (SQL_SLOW_MS) пишутся в журнал медленных запросов
+(SQL_SLOW_LOG, JSON по строке на запрос) вместе с EXPLAIN QUERY PLAN;
+план с "USE TEMP B-TREE" означает сортировку или группировку без
+подходящего индекса.
+
+Время - только execute (для SELECT - до первой строки, включая сортировку),
+выборка строк не учитывается.
+
+SQLite передает в трассировку команды с подставленными значениями, в том
+числе хэши паролей, логины и телефоны. Поэтому строковые и двоичные
+литералы в записанных командах заменяются на ?, а от параметров остаются
+только их типы.
+
+    SQL_TRACE=1 SQL_SLOW_MS=20 uvicorn main:app
+    python sqltrace.py slow_queries.log     # сводка журнала медленных запросов
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+ENABLED = os.environ.get("SQL_TRACE", "") == "1"
+SLOW_QUERY_MS = float(os.environ.get("SQL_SLOW_MS", "50"))
+SLOW_LOG_PATH = os.environ.get("SQL_SLOW_LOG", "slow_queries.log")
+RECENT_SIZE = 1000
+
+# Файлы слоя доступа к БД: вызывающая функция ищется выше них по стеку
+INTERNAL_FILES = ("sqltrace.py", "database.py", "contextlib.py")
+
+WHITESPACE_RE = re.compile(r"\s+")
+EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+# Строковые и двоичные литералы ('...' с удвоенными кавычками внутри, X'...')
+LITERAL_RE = re.compile(r"[xX]?'(?:[^']|'')*'")
+
+recent = deque(maxlen=RECENT_SIZE)  # последние выполненные запросы
+_totals: Dict[tuple, list] = {}      # (функция, SQL) -> [число, суммарное мс, максимум мс]
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def enable(slow_ms: Optional[float] = None, log_path: Optional[str] = None):
+    """Включить трассировку (соединения подключаются при следующем запросе)"""
+    global ENABLED, SLOW_QUERY_MS, SLOW_LOG_PATH
+    if slow_ms is not None:
+        SLOW_QUERY_MS = slow_ms
+    if log_path is not None:
+        SLOW_LOG_PATH = log_path
+    ENABLED = True
+
+
+def disable():
+    """Выключить трассировку"""
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """Очистить накопленную статистику"""
+    with _lock:
+        recent.clear()
+        _totals.clear()
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL в одну строку (ключ для группировки)"""
+    return WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def redact(statement: str) -> str:
+    """Команда без значений строковых и двоичных литералов"""
+    return LITERAL_RE.sub("?", statement)
+
+
+def parameter_types(parameters) -> list:
+    """Типы параметров запроса (сами значения не записываются)"""
+    if parameters is None:
+        return []
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+def calling_function() -> str:
+    """Первая функция на стеке вне слоя доступа к БД: модуль.функция"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if os.path.basename(frame.f_code.co_filename) not in INTERNAL_FILES:
+            module = frame.f_globals.get("__name__", "?")
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def attach(conn: sqlite3.Connection):
+    """Подключить к соединению запись выполняемых команд (только пока трассировка включена)"""
+    statements = conn.traced_statements = []
+
+    def on_statement(statement: str):
+        if ENABLED:
+            statements.append(redact(statement))
+
+    conn.set_trace_callback(on_statement)
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters=()) -> List[str]:
+    """EXPLAIN QUERY PLAN запроса (строки плана с отступами по вложенности)"""
+    cursor = sqlite3.Cursor(conn)
+    try:
+        rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    finally:
+        cursor.close()
+    depth = {0: -1}
+    plan = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return plan
+
+
+def trace_call(conn: sqlite3.Connection, method, args: tuple):
+    """Выполнить method(*args) курсора с записью команд, времени и плана медленного запроса"""
+    if getattr(conn, "traced_statements", None) is None:
+        attach(conn)
+    caller = calling_function()
+    statements = conn.traced_statements
+    statements.clear()
+    started = time.perf_counter()
+    try:
+        return method(*args)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        sql = normalize_sql(args[0])
+        executed = list(statements)
+        statements.clear()
+        # План - только для execute: у executemany и executescript нет одного набора параметров
+        parameters = args[1] if method.__name__ == "execute" else None
+        record(conn, caller, sql, parameters, executed, elapsed_ms)
+
+
+def record(conn: sqlite3.Connection, caller: str, sql: str, parameters, executed: List[str], elapsed_ms: float):
+    """Учесть выполненный запрос; медленный - записать в журнал с планом"""
+    entry = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "caller": caller,
+        "sql": sql,
+        "ms": round(elapsed_ms, 3),
+        "parameter_types": parameter_types(parameters),
+        "statements": executed,
+    }
+    with _lock:
+        recent.append(entry)
+        totals = _totals.get((caller, sql))
+        if totals is None:
+            totals = _totals[(caller, sql)] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += elapsed_ms
+        totals[2] = max(totals[2], elapsed_ms)
+
+    if elapsed_ms < SLOW_QUERY_MS or not SLOW_LOG_PATH:
+        return
+    if parameters is not None and EXPLAINABLE_RE.match(sql):
+        try:
+            entry["plan"] = explain(conn, sql, parameters)
+        except sqlite3.Error as e:
+            entry["plan_error"] = str(e)
+        entry["temp_btree"] = any("TEMP B-TREE" in line for line in entry.get("plan", ()))
+    line = json.dumps(entry, ensure_ascii=False)
+    with _log_lock:
+        with open(SLOW_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def top_statements(limit: int = 20) -> List[Dict]:
+    """Запросы с наибольшим суммарным временем с момента включения"""
+    with _lock:
+        items = list(_totals.items())
+    items.sort(key=lambda item: item[1][1], reverse=True)
+    return [
+        {"caller": caller, "sql": sql, "count": count, "total_ms": total, "avg_ms": total / count, "max_ms": peak}
+        for (caller, sql), (count, total, peak) in items[:limit]
+    ]
+
+
+def print_top_statements(limit: int = 20):
+    print(f"{'вызовов':>8s} {'всего мс':>10s} {'сред. мс':>9s} {'макс. мс':>9s}  функция / запрос")
+    for item in top_statements(limit):
+        print(f"{item['count']:8d} {item['total_ms']:10.1f} {item['avg_ms']:9.3f} {item['max_ms']:9.3f}  "
+              f"{item['caller']}\n{'':41s}{item['sql'][:160]}")
+
+
+def summarize_slow_log(path: str) -> List[Dict]:
+    """Медленные запросы из журнала, сгруппированные по функции и SQL"""
+    groups = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key = (entry["caller"], entry["sql"])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {"caller": entry["caller"], "sql": entry["sql"], "count": 0,
+                                       "max_ms": 0.0, "plan": None, "temp_btree": False}
+            group["count"] += 1
+            if entry["ms"] >= group["max_ms"]:
+                group["max_ms"] = entry["ms"]
+                group["plan"] = entry.get("plan") or group["plan"]
+            group["temp_btree"] = group["temp_btree"] or entry.get("temp_btree", False)
+    return sorted(groups.values(), key=lambda g: g["max_ms"], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сводка журнала медленных SQL-запросов")
+    parser.add_argument("log", nargs="?", default=SLOW_LOG_PATH, help="журнал (SQL_SLOW_LOG)")
+    args = parser.parse_args(argv)
+
+    try:
+        groups = summarize_slow_log(args.log)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка чтения журнала: {e}", file=sys.stderr)
+        return 1
+    for group in groups:
+        mark = "  [TEMP B-TREE]" if group["temp_btree"] else ""
+        print(f"{group['caller']}: {group['count']} раз, макс. {group['max_ms']:.1f} мс{mark}")
+        print(f"  {group['sql'][:200]}")
+        for plan_line in group["plan"] or ():
+            print(f"    {plan_line}")
+    print(f"Медленных запросов: {sum(g['count'] for g in groups)}, "
+          f"с временным B-деревом: {sum(g['count'] for g in groups if g['temp_btree'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())